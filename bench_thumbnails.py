@@ -0,0 +1,206 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import itertools
+import subprocess
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import main
+from main import create_thumbnail, clear_thumbnail_caches, safe_print
+
+# ----- Microbenchmark du rendu des thumbnails -----
+#
+# Chaque variante tourne dans un processus fils pour que le pic de RSS et
+# l'etat des caches soient propres a la variante:
+# - froid: caches memoire vides et cache disque (pack de sprites, etiquettes)
+#   dans un dossier temporaire neuf a chaque rendu;
+# - disque: caches memoire vides, cache disque deja rempli;
+# - chaud: rendu precedent du meme cas, tous les caches remplis.
+
+SIZE_CLASSES = ["leger", "moyen", "lourd"]
+
+NAME_BUCKETS = {
+    "court": "Noka",
+    "moyen": "SR Necroma",
+    "long": "LeDindonBarbare",
+    "tres_long": "LeDindonBarbare Du Dimanche Soir",
+}
+
+SET_NAME = "Winners Quarter Final"
+VARIANTS = ["froid", "disque", "chaud"]
+PERCENTILES = [50, 90, 99]
+
+
+def classify_sprites(sprites_dir):
+    sprites = sorted(
+        (os.path.getsize(os.path.join(sprites_dir, entry)), entry[:-4])
+        for entry in os.listdir(sprites_dir)
+        if entry.endswith(".png")
+    )
+    classes = {}
+    for i, (_, name) in enumerate(sprites):
+        size_class = SIZE_CLASSES[i * len(SIZE_CLASSES) // len(sprites)]
+        classes.setdefault(size_class, []).append(name)
+    return classes
+
+
+def build_cases(sprites_dir):
+    classes = classify_sprites(sprites_dir)
+    cases = []
+    # Matrice classes de sprites x longueurs de noms.
+    for (class1, class2), (bucket, name) in itertools.product(
+        itertools.product(SIZE_CLASSES, repeat=2), NAME_BUCKETS.items()
+    ):
+        index = len(cases)
+        sprites1 = classes[class1]
+        sprites2 = classes[class2]
+        cases.append(
+            {
+                "pairing": f"{class1}/{class2}",
+                "bucket": bucket,
+                "player1_skin": sprites1[index % len(sprites1)],
+                "player1_name": name,
+                "player2_skin": sprites2[(index + 1) % len(sprites2)],
+                "player2_name": name,
+            }
+        )
+    # Passage sur tout le roster: chaque sprite une fois a gauche et a droite.
+    roster = [name for size_class in SIZE_CLASSES for name in classes[size_class]]
+    for player1_skin, player2_skin in zip(roster, roster[1:] + roster[:1]):
+        cases.append(
+            {
+                "pairing": "roster",
+                "bucket": "moyen",
+                "player1_skin": player1_skin,
+                "player1_name": NAME_BUCKETS["moyen"],
+                "player2_skin": player2_skin,
+                "player2_name": NAME_BUCKETS["moyen"],
+            }
+        )
+    return cases
+
+
+def render_case(case, args, output_path):
+    start = time.perf_counter()
+    ok = create_thumbnail(
+        args.background,
+        case["player1_skin"],
+        case["player1_name"],
+        case["player2_skin"],
+        case["player2_name"],
+        SET_NAME,
+        output_path,
+        args.sprites_dir,
+        True,
+        args.center_logo,
+    )
+    return time.perf_counter() - start, ok
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss est en octets sur macOS et en kilo-octets ailleurs.
+    if sys.platform == "darwin":
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+def run_variant(args):
+    cases = build_cases(args.sprites_dir)
+    timings = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_path = os.path.join(tmp_dir, "bench_thumbnail.png")
+        for case in cases:
+            for _ in range(args.repeat):
+                if args.variant == "froid":
+                    main.CACHE_DIR = tempfile.mkdtemp(dir=tmp_dir)
+                    main.TEXT_CACHE_DIR = os.path.join(main.CACHE_DIR, "text")
+                    clear_thumbnail_caches()
+                elif args.variant == "disque":
+                    clear_thumbnail_caches()
+                else:
+                    render_case(case, args, output_path)
+                elapsed, ok = render_case(case, args, output_path)
+                timings.append(
+                    {
+                        "pairing": case["pairing"],
+                        "bucket": case["bucket"],
+                        "seconds": elapsed,
+                        "ok": ok,
+                    }
+                )
+    print(json.dumps({"timings": timings, "peak_rss_mb": peak_rss_mb()}))
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    k = (len(ordered) - 1) * pct / 100
+    lower = int(k)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (k - lower)
+
+
+def format_stats(values):
+    parts = [f"p{pct}={percentile(values, pct) * 1000:7.1f}ms" for pct in PERCENTILES]
+    parts.append(f"max={max(values) * 1000:7.1f}ms")
+    return "  ".join(parts)
+
+
+def report(variant, result):
+    timings = result["timings"]
+    failures = sum(1 for t in timings if not t["ok"])
+    rss = result["peak_rss_mb"]
+    safe_print(f"\n{'='*50}")
+    safe_print(f"Variante: {variant} ({len(timings)} thumbnails, {failures} echecs)")
+    safe_print(f"Pic RSS: {rss:.1f} Mo" if rss is not None else "Pic RSS: n/a")
+    safe_print(f"{'='*50}")
+    safe_print(f"{'total':<16} {format_stats([t['seconds'] for t in timings])}")
+    for key in ["pairing", "bucket"]:
+        groups = {}
+        for t in timings:
+            groups.setdefault(t[key], []).append(t["seconds"])
+        for group, values in groups.items():
+            safe_print(f"{group:<16} {format_stats(values)}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Microbenchmark de create_thumbnail sur tout le roster"
+    )
+    parser.add_argument(
+        "--background", default="thumbnail/background/Background_BC.png"
+    )
+    parser.add_argument("--sprites_dir", default="thumbnail/sprites")
+    parser.add_argument("--center_logo", default="thumbnail/assets/LogoBc/LogoBC16.png")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--variant", choices=VARIANTS, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.variant:
+        # Processus fils: le resultat JSON est la derniere ligne de stdout.
+        run_variant(args)
+        sys.exit(0)
+    for variant in VARIANTS:
+        child = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), *sys.argv[1:]]
+            + ["--variant", variant],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            check=True,
+        )
+        report(variant, json.loads(child.stdout.strip().splitlines()[-1]))
@@ -0,0 +1,49 @@
+import argparse
+
+from PIL import Image
+
+from main import (
+    THUMBNAIL_LAYOUT,
+    build_sprite_pack,
+    layout_sprite_height,
+    load_layout,
+    safe_print,
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Construit le pack de sprites pre-mis a l'echelle"
+    )
+    parser.add_argument("--sprites_dir", default="thumbnail/sprites")
+    parser.add_argument(
+        "--background",
+        action="append",
+        help="Fond dont la hauteur fixe une taille de sprite (repetable)",
+    )
+    parser.add_argument(
+        "--layout",
+        default=THUMBNAIL_LAYOUT,
+        help="Gabarit qui donne la hauteur des sprites pour chaque fond",
+    )
+    parser.add_argument(
+        "--height",
+        type=int,
+        action="append",
+        default=[],
+        help="Hauteur de sprite supplementaire (repetable)",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    heights = set(args.height)
+    layout, _ = load_layout(args.layout)
+    for background_path in args.background or [
+        "thumbnail/background/Background_BC.png"
+    ]:
+        with Image.open(background_path) as background:
+            heights.add(layout_sprite_height(layout, background.size))
+    pack_path = build_sprite_pack(args.sprites_dir, heights)
+    safe_print(f"[OK] Pack de sprites genere: {pack_path}")
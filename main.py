@@ -2,12 +2,40 @@ import os
 import sys
 import pandas as pd
 import ffmpeg
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw, ImageFilter, ImageFont, ImageTk, PngImagePlugin
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 import tkinter as tk
 from tkinter import filedialog, messagebox
 from tkinter import ttk
 import threading
 import queue
+import time
+import subprocess
+import shutil
+import tempfile
+import json
+import mmap
+import glob
+import struct
+import hashlib
+import math
+import io
+import ast
+import asyncio
+import collections
+import difflib
+import unicodedata
+import re
+import csv
+import ctypes
+import ctypes.util
+import select
+import argparse
+from contextlib import contextmanager
 
 # ----- Méthodes utilitaires -----
 
@@ -15,6 +43,15 @@ if sys.platform == "win32":
     sys.stdout.reconfigure(encoding="utf-8", errors="replace")
     sys.stderr.reconfigure(encoding="utf-8", errors="replace")
 
+# Fonctions de vidage des caches du rendu des thumbnails, appelees par
+# clear_thumbnail_caches() (ex: pour mesurer un rendu a froid).
+_THUMBNAIL_CACHE_CLEARERS = []
+
+
+def clear_thumbnail_caches():
+    for clear in _THUMBNAIL_CACHE_CLEARERS:
+        clear()
+
 
 def safe_print(message, log_widget=None, log_queue=None):
     try:
@@ -37,7 +74,8 @@ def safe_print(message, log_widget=None, log_queue=None):
 def load_character_image(character_name, sprites_dir="thumbnail/sprites"):
     try:
         image_path = os.path.join(sprites_dir, f"{character_name}.png")
-        if not os.path.exists(image_path):
+        index = get_sprite_index(sprites_dir)
+        if index is None or character_name not in index:
             safe_print(f"Erreur: Image de personnage non trouvee: {image_path}")
             return None
         return Image.open(image_path)
@@ -46,20 +84,285 @@ def load_character_image(character_name, sprites_dir="thumbnail/sprites"):
         return None
 
 
+# ----- Pack de sprites -----
+#
+# Les sprites deja mis a l'echelle (et rognes a leur boite alpha) sont ranges
+# en RGBA brut dans un seul fichier mappe en memoire, suivi d'un index JSON:
+#   [donnees RGBA][index JSON][taille de l'index, uint64][SPRITE_PACK_MAGIC]
+# Le nom du fichier contient une signature des PNG sources et des hauteurs
+# stockees: un PNG modifie donne un autre fichier, reconstruit a la demande.
+# Le scan des PNG est reutilise tant que la date du dossier ne bouge pas;
+# un PNG ecrase sur place ne la change pas, donc le PNG du sprite charge est
+# quand meme compare au scan (un stat) et un ecart relance le scan. Un pack
+# peut rester mappe par un autre processus apres son remplacement: les anciens
+# packs ne sont supprimes qu'apres SPRITE_PACK_PRUNE_AGE secondes sans
+# ouverture.
+
+CACHE_DIR = "thumbnail/cache"
+SPRITE_PACK_MAGIC = b"SSPACK01"
+SPRITE_PACK_TRAILER = struct.Struct("<Q")
+SPRITE_PACK_PRUNE_AGE = 24 * 3600
+
+_sprite_packs = {}
+_sprite_pack_prefixes = {}
+_sprite_pack_lock = threading.Lock()
+_THUMBNAIL_CACHE_CLEARERS.append(_sprite_packs.clear)
+_THUMBNAIL_CACHE_CLEARERS.append(_sprite_pack_prefixes.clear)
+
+
+def scan_sprite_sources(sprites_dir):
+    sources = {}
+    for entry in os.scandir(sprites_dir):
+        if entry.is_file() and entry.name.lower().endswith(".png"):
+            stat = entry.stat()
+            sources[entry.name[:-4]] = [stat.st_mtime_ns, stat.st_size]
+    return sources
+
+
+def sprite_pack_prefix(sprites_dir, sources):
+    dir_hash = hashlib.sha1(os.path.abspath(sprites_dir).encode("utf-8")).hexdigest()
+    sources_hash = hashlib.sha1(
+        json.dumps(sources, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+    return os.path.join(CACHE_DIR, f"sprites_{dir_hash[:10]}_{sources_hash[:10]}")
+
+
+def get_sprite_pack_prefix(sprites_dir, character_name=None):
+    key = (os.path.abspath(sprites_dir), os.stat(sprites_dir).st_mtime_ns)
+    cached = _sprite_pack_prefixes.get(key)
+    if cached is not None and character_name in cached[0]:
+        try:
+            stat = os.stat(os.path.join(sprites_dir, f"{character_name}.png"))
+            signature = [stat.st_mtime_ns, stat.st_size]
+        except OSError:
+            signature = None
+        if signature != cached[0][character_name]:
+            cached = None
+    if cached is None:
+        sources = scan_sprite_sources(sprites_dir)
+        cached = (sources, sprite_pack_prefix(sprites_dir, sources))
+        _sprite_pack_prefixes[key] = cached
+    return cached[1]
+
+
+# Demi-largeur du noyau LANCZOS (a=3) en pixels source, pour savoir jusqu'ou
+# un pixel opaque deborde apres redimensionnement.
+LANCZOS_SUPPORT = 3
+
+_sprite_bboxes = {}
+_THUMBNAIL_CACHE_CLEARERS.append(_sprite_bboxes.clear)
+
+
+def get_sprite_bbox(image, cache_key=None):
+    bbox = _sprite_bboxes.get(cache_key) if cache_key else None
+    if bbox is None:
+        bbox = image.getchannel("A").getbbox() or (0, 0, 1, 1)
+        if cache_key:
+            _sprite_bboxes[cache_key] = bbox
+    return bbox
+
+
+def scale_character_image(image, skin_height, mirrored=False, source_bbox=None):
+    # Retourne le sprite rogne a sa boite alpha, son decalage dans l'image
+    # mise a l'echelle et la largeur de cette image complete. Seule la zone
+    # utile de la source est redimensionnee (resize avec box), ce qui donne
+    # les memes pixels qu'un redimensionnement complet suivi d'un crop.
+    image = image.convert("RGBA")
+    full_width = int(skin_height * image.width / image.height)
+    scale_x = full_width / image.width
+    scale_y = skin_height / image.height
+    left, top, right, bottom = source_bbox or get_sprite_bbox(image)
+    margin_x = math.ceil(LANCZOS_SUPPORT * max(1, scale_x)) + 1
+    margin_y = math.ceil(LANCZOS_SUPPORT * max(1, scale_y)) + 1
+    dest_box = (
+        max(0, math.floor(left * scale_x) - margin_x),
+        max(0, math.floor(top * scale_y) - margin_y),
+        min(full_width, math.ceil(right * scale_x) + margin_x),
+        min(skin_height, math.ceil(bottom * scale_y) + margin_y),
+    )
+    sprite = image.resize(
+        (dest_box[2] - dest_box[0], dest_box[3] - dest_box[1]),
+        Image.LANCZOS,
+        box=(
+            dest_box[0] / scale_x,
+            dest_box[1] / scale_y,
+            dest_box[2] / scale_x,
+            dest_box[3] / scale_y,
+        ),
+    )
+    inner_bbox = sprite.getchannel("A").getbbox() or (0, 0, 1, 1)
+    sprite = sprite.crop(inner_bbox)
+    offset = (dest_box[0] + inner_bbox[0], dest_box[1] + inner_bbox[1])
+    if mirrored:
+        return mirror_character_sprite(sprite, offset, full_width)
+    return sprite, offset, full_width
+
+
+def mirror_character_sprite(sprite, offset, full_width):
+    return (
+        sprite.transpose(Image.FLIP_LEFT_RIGHT),
+        (full_width - offset[0] - sprite.width, offset[1]),
+        full_width,
+    )
+
+
+def build_sprite_pack(sprites_dir, heights, log_queue=None):
+    sources = scan_sprite_sources(sprites_dir)
+    heights = sorted(set(heights))
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    pack_path = (
+        f"{sprite_pack_prefix(sprites_dir, sources)}_"
+        f"{'-'.join(map(str, heights))}.pack"
+    )
+    safe_print(
+        f"Construction du pack de sprites ({len(sources)} sprites, hauteurs "
+        f"{heights}): {pack_path}",
+        log_queue=log_queue,
+    )
+    index = {"heights": heights, "sources": sources, "sprites": {}}
+    tmp_path = f"{pack_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        for name in sorted(sources):
+            with Image.open(os.path.join(sprites_dir, f"{name}.png")) as source:
+                source = source.convert("RGBA")
+                source_bbox = get_sprite_bbox(source)
+                entries = {}
+                for height in heights:
+                    entry = {}
+                    normal = scale_character_image(source, height, False, source_bbox)
+                    for variant, (sprite, offset, full_width) in (
+                        ("normal", normal),
+                        ("mirrored", mirror_character_sprite(*normal)),
+                    ):
+                        entry[variant] = {
+                            "data": f.tell(),
+                            "size": sprite.size,
+                            "offset": offset,
+                            "full_width": full_width,
+                        }
+                        f.write(sprite.tobytes())
+                    entries[str(height)] = entry
+            index["sprites"][name] = entries
+        index_bytes = json.dumps(index).encode("utf-8")
+        f.write(index_bytes)
+        f.write(SPRITE_PACK_TRAILER.pack(len(index_bytes)))
+        f.write(SPRITE_PACK_MAGIC)
+    os.replace(tmp_path, pack_path)
+    prune_sprite_packs(sprites_dir, pack_path)
+    return pack_path
+
+
+def prune_sprite_packs(sprites_dir, keep_path):
+    # Un pack ouvert est touche (open_sprite_pack): seuls les packs de ce
+    # dossier inutilises depuis SPRITE_PACK_PRUNE_AGE sont supprimes. Un
+    # echec (pack encore mappe sous Windows) est retente au build suivant.
+    dir_prefix = sprite_pack_prefix(sprites_dir, {}).rsplit("_", 1)[0]
+    cutoff = time.time() - SPRITE_PACK_PRUNE_AGE
+    for old_path in glob.glob(f"{dir_prefix}_*.pack"):
+        if old_path == keep_path:
+            continue
+        try:
+            if os.path.getmtime(old_path) < cutoff:
+                os.remove(old_path)
+        except OSError:
+            pass
+
+
+def open_sprite_pack(pack_path):
+    with open(pack_path, "rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    trailer_start = len(data) - len(SPRITE_PACK_MAGIC) - SPRITE_PACK_TRAILER.size
+    if data[trailer_start + SPRITE_PACK_TRAILER.size :] != SPRITE_PACK_MAGIC:
+        raise ValueError(f"Pack de sprites invalide: {pack_path}")
+    (index_size,) = SPRITE_PACK_TRAILER.unpack_from(data, trailer_start)
+    index = json.loads(data[trailer_start - index_size : trailer_start])
+    try:
+        os.utime(pack_path)
+    except OSError:
+        pass
+    return {"path": pack_path, "index": index, "data": data}
+
+
+def get_sprite_pack(sprites_dir, height, log_queue=None, character_name=None):
+    prefix = get_sprite_pack_prefix(sprites_dir, character_name)
+    with _sprite_pack_lock:
+        pack = _sprite_packs.get(prefix)
+        if pack is None or height not in pack["index"]["heights"]:
+            pack = None
+            heights = {height}
+            for pack_path in glob.glob(f"{prefix}_*.pack"):
+                try:
+                    candidate = open_sprite_pack(pack_path)
+                except (OSError, ValueError):
+                    continue
+                if height in candidate["index"]["heights"]:
+                    pack = candidate
+                    break
+                heights.update(candidate["index"]["heights"])
+            if pack is None:
+                pack = open_sprite_pack(
+                    build_sprite_pack(sprites_dir, heights, log_queue=log_queue)
+                )
+            # Le pack remplace reste mappe tant qu'une image y fait reference.
+            dir_prefix = prefix.rsplit("_", 1)[0]
+            for old_prefix in list(_sprite_packs):
+                if old_prefix.rsplit("_", 1)[0] == dir_prefix:
+                    del _sprite_packs[old_prefix]
+            _sprite_packs[prefix] = pack
+    return pack
+
+
+def load_scaled_character(
+    character_name, sprites_dir, skin_height, mirrored=False, log_queue=None
+):
+    try:
+        pack = get_sprite_pack(
+            sprites_dir, skin_height, log_queue=log_queue, character_name=character_name
+        )
+    except Exception as e:
+        safe_print(f"Pack de sprites indisponible: {e}", log_queue=log_queue)
+        pack = None
+    if pack is not None:
+        entries = pack["index"]["sprites"].get(character_name)
+        if entries is None:
+            safe_print(
+                "Erreur: Image de personnage non trouvee: "
+                f"{os.path.join(sprites_dir, f'{character_name}.png')}",
+                log_queue=log_queue,
+            )
+            return None
+        entry = entries[str(skin_height)]["mirrored" if mirrored else "normal"]
+        size = tuple(entry["size"])
+        start = entry["data"]
+        buffer = memoryview(pack["data"])[start : start + size[0] * size[1] * 4]
+        sprite = Image.frombuffer("RGBA", size, buffer, "raw", "RGBA", 0, 1)
+        return sprite, tuple(entry["offset"]), entry["full_width"]
+    image = load_character_image(character_name, sprites_dir)
+    if image is None:
+        return None
+    image = image.convert("RGBA")
+    image_path = os.path.join(sprites_dir, f"{character_name}.png")
+    source_bbox = get_sprite_bbox(image, (image_path, os.stat(image_path).st_mtime_ns))
+    return scale_character_image(image, skin_height, mirrored, source_bbox)
+
+
 def get_font_size_for_text(text, max_width, font_path, base_size, min_size=20):
+    key = (text, max_width, font_path, base_size, min_size)
+    if key in _font_sizes:
+        return _font_sizes[key]
     font_size = base_size
     while font_size > min_size:
         try:
-            font = ImageFont.truetype(font_path, font_size)
-            temp_img = Image.new("RGB", (1, 1))
-            temp_draw = ImageDraw.Draw(temp_img)
-            text_width = temp_draw.textlength(text, font=font)
+            font = get_font(font_path, font_size)
+            text_width = font.getlength(text)
             if text_width <= max_width:
-                return font_size
+                break
             font_size -= 2
         except:
             break
-    return max(min_size, font_size)
+    font_size = max(min_size, font_size)
+    _font_sizes[key] = font_size
+    return font_size
 
 
 def get_unique_filename(base_path):
@@ -74,466 +377,3879 @@ def get_unique_filename(base_path):
         counter += 1
 
 
+def parse_timecode(timecode):
+    if isinstance(timecode, str):
+        parts = timecode.split(":")
+        if len(parts) == 3:
+            hours, minutes, seconds = map(float, parts)
+            return hours * 3600 + minutes * 60 + seconds
+        elif len(parts) == 2:
+            minutes, seconds = map(float, parts)
+            return minutes * 60 + seconds
+    return float(timecode)
+
+
 def timecode_to_seconds(timecode):
     if pd.isna(timecode) or timecode == "":
         return None
     try:
-        if isinstance(timecode, str):
-            parts = timecode.split(":")
-            if len(parts) == 3:
-                hours, minutes, seconds = map(float, parts)
-                return hours * 3600 + minutes * 60 + seconds
-            elif len(parts) == 2:
-                minutes, seconds = map(float, parts)
-                return minutes * 60 + seconds
-            else:
-                return float(timecode)
-        else:
-            return float(timecode)
+        return parse_timecode(timecode)
     except (ValueError, AttributeError):
         safe_print(f"Format de timecode invalide: {timecode}")
         return None
 
 
-def create_thumbnail(
-    background_path,
-    player1_skin,
-    player1_name,
-    player2_skin,
-    player2_name,
-    set_name,
-    output_path,
-    sprites_dir="thumbnail/sprites",
-    reset_thumbnails=False,
-    center_logo="thumbnail/assets/LogoBC/LogoBC16.png",
-    log_queue=None,
-):
-    if not reset_thumbnails:
-        output_path = get_unique_filename(output_path)
-    try:
-        background = Image.open(background_path)
-    except Exception as e:
-        safe_print(f"Erreur lors de l'ouverture du fond: {e}", log_queue=log_queue)
-        return False
-    try:
-        brush = Image.open("thumbnail/assets/Brush.png")
-    except Exception as e:
-        safe_print(f"Erreur lors de l'ouverture de la brush: {e}", log_queue=log_queue)
-        return False
-    try:
-        center_bar = Image.open("thumbnail/assets/MiddleBar.png")
-    except Exception as e:
-        safe_print(f"Erreur lors de l'ouverture de la barre: {e}", log_queue=log_queue)
-        return False
-    try:
-        center_logo_img = Image.open(center_logo)
-    except Exception as e:
-        safe_print(f"Erreur lors de l'ouverture du logo: {e}", log_queue=log_queue)
-        return False
+# ----- Index des sprites -----
+#
+# Le dossier des sprites est scanne une fois en un index des noms canoniques
+# (relu quand le dossier change). Un skin du CSV est compare par sa forme
+# normalisee (minuscules, sans accents, espaces ni ponctuation), puis par la
+# table d'alias (noms anglais et variantes francaises). Un skin qui enchaine
+# plusieurs personnages ("Luigi/Wario", "metaknightwario") est le plus
+# souvent une faute de saisie: il reste inconnu et le premier personnage est
+# seulement propose, avant les noms proches trouves par difflib. Tous les
+# skins sont resolus a la planification, avant le premier rendu.
 
-    width, height = background.size
+SKIN_COLUMNS = ["player1_skin", "player2_skin"]
 
-    player1_img = load_character_image(player1_skin, sprites_dir)
-    player2_img = load_character_image(player2_skin, sprites_dir)
+SPRITE_ALIASES = {
+    "greninja": "amphinobi",
+    "banjokazooie": "banjo",
+    "banjoetkazooie": "banjo",
+    "bayo": "bayonetta",
+    "bowserjunior": "bowserjr",
+    "falcon": "captainfalcon",
+    "capitainefalcon": "captainfalcon",
+    "kamui": "corrin",
+    "robin": "daraen",
+    "pitmalefique": "darkpit",
+    "diddy": "diddykong",
+    "drmario": "docteurmario",
+    "doctormario": "docteurmario",
+    "docmario": "docteurmario",
+    "dk": "donkeykong",
+    "pokemontrainer": "dresseurpokemon",
+    "duckhuntduo": "duckhunt",
+    "incineroar": "felinferno",
+    "mrgameandwatch": "gameandwatch",
+    "mrgamewatch": "gameandwatch",
+    "gamewatch": "gameandwatch",
+    "gnw": "gameandwatch",
+    "ganon": "ganondorf",
+    "hero": "heros",
+    "icies": "iceclimbers",
+    "krool": "kingkrool",
+    "toonlink": "linkcartoon",
+    "younglink": "linkenfant",
+    "isabelle": "marie",
+    "rockman": "megaman",
+    "mk": "metaknight",
+    "bagarreurmii": "miibrawler",
+    "miibagarreur": "miibrawler",
+    "miiswordfighter": "miiepeiste",
+    "epeistemii": "miiepeiste",
+    "tireurmii": "miigunner",
+    "miitireur": "miigunner",
+    "alph": "olimar",
+    "piranhaplant": "plantepiranha",
+    "pyra": "pyramythra",
+    "mythra": "pyramythra",
+    "aegis": "pyramythra",
+    "homura": "pyramythra",
+    "hikari": "pyramythra",
+    "kingdedede": "roidadidou",
+    "dedede": "roidadidou",
+    "jigglypuff": "rondoudou",
+    "harmonie": "rosalina",
+    "rosalinaandluma": "rosalina",
+    "harmonieetluma": "rosalina",
+    "zerosuitsamus": "samussansarmure",
+    "zss": "samussansarmure",
+    "darksamus": "samussombre",
+    "alex": "steve",
+    "terrybogard": "terry",
+    "villager": "villageois",
+    "wiifittrainer": "wiifit",
+    "entraineurwiifit": "wiifit",
+    "entraineusewiifit": "wiifit",
+    "aleatoire": "random",
+}
+SPRITE_SUGGESTIONS = 3
+SPRITE_SUGGESTION_CUTOFF = 0.6
 
-    if not player1_img or not player2_img:
-        safe_print(
-            f"Impossible de charger les images des skins: {player1_skin}, {player2_skin}",
-            log_queue=log_queue,
+_sprite_indexes = {}
+_THUMBNAIL_CACHE_CLEARERS.append(_sprite_indexes.clear)
+
+
+def normalise_sprite_name(name):
+    text = unicodedata.normalize("NFKD", str(name)).lower()
+    return "".join(c for c in text if c.isascii() and c.isalnum())
+
+
+class SpriteIndex:
+    def __init__(self, sprites_dir):
+        self.sprites_dir = sprites_dir
+        self.sources = scan_sprite_sources(sprites_dir)
+        # Forme normalisee -> nom canonique; un vrai nom de fichier passe
+        # avant un alias.
+        self.keys = {
+            alias: name
+            for alias, name in SPRITE_ALIASES.items()
+            if name in self.sources
+        }
+        for name in self.sources:
+            self.keys[normalise_sprite_name(name)] = name
+        self.resolved = {}
+
+    def __contains__(self, name):
+        return name in self.sources
+
+    def split(self, key):
+        # Plus long prefixe connu dont le reste est aussi un (ou plusieurs)
+        # personnage(s).
+        for end in range(len(key) - 1, 1, -1):
+            first = self.keys.get(key[:end])
+            rest = key[end:]
+            if first and (rest in self.keys or self.split(rest)):
+                return first
+        return None
+
+    def resolve(self, name):
+        if name in self.sources:
+            return name
+        if name not in self.resolved:
+            key = normalise_sprite_name(name)
+            self.resolved[name] = self.keys.get(key)
+        return self.resolved[name]
+
+    def suggest(self, name):
+        key = normalise_sprite_name(name)
+        matches = difflib.get_close_matches(
+            key, self.keys, n=SPRITE_SUGGESTIONS * 2, cutoff=SPRITE_SUGGESTION_CUTOFF
         )
-        return False
+        first = self.split(key)
+        suggestions = [first] if first else []
+        for match in matches:
+            if self.keys[match] not in suggestions:
+                suggestions.append(self.keys[match])
+        return suggestions[:SPRITE_SUGGESTIONS]
 
-    skin_height = int(height * 0.7 * 1.25)
-    p1_ratio = player1_img.width / player1_img.height
-    p2_ratio = player2_img.width / player2_img.height
 
-    player1_img = player1_img.resize(
-        (int(skin_height * p1_ratio), skin_height), Image.LANCZOS
-    )
-    player2_img = player2_img.resize(
-        (int(skin_height * p2_ratio), skin_height), Image.LANCZOS
-    )
+def get_sprite_index(sprites_dir):
+    try:
+        key = (os.path.abspath(sprites_dir), os.stat(sprites_dir).st_mtime_ns)
+    except OSError:
+        key = (os.path.abspath(sprites_dir), None)
+    index = _sprite_indexes.get(key)
+    if index is None:
+        index = SpriteIndex(sprites_dir) if key[1] is not None else None
+        _sprite_indexes.clear()
+        _sprite_indexes[key] = index
+    return index
+
+
+def unknown_sprite_message(index, skin):
+    message = f"Sprite inconnu: {skin}"
+    suggestions = index.suggest(skin) if index is not None else []
+    if suggestions:
+        message += f" (proches: {', '.join(suggestions)})"
+    return message
+
+
+def resolve_set_sprites(sets, sprites_dir, log_queue=None):
+    # Un set dont un skin reste inconnu garde sa video mais pas sa thumbnail.
+    index = get_sprite_index(sprites_dir)
+    for job in sets:
+        players = job["players"]
+        if not players:
+            continue
+        unknown = False
+        for field in SKIN_COLUMNS:
+            skin = players[field]
+            name = index.resolve(skin) if index is not None else None
+            if name is None:
+                safe_print(
+                    f"[ERREUR] {job['set_name']}: "
+                    + unknown_sprite_message(index, skin),
+                    log_queue=log_queue,
+                )
+                unknown = True
+            elif name != skin:
+                safe_print(
+                    f"{job['set_name']}: skin {skin} resolu en {name}",
+                    log_queue=log_queue,
+                )
+                players[field] = name
+        if unknown:
+            safe_print(
+                f"[ERREUR] {job['set_name']}: thumbnail ignoree", log_queue=log_queue
+            )
+            job["players"] = None
+
+
+# ----- Rendu des thumbnails -----
+
+_thumbnail_assets = {}
+_THUMBNAIL_CACHE_CLEARERS.append(_thumbnail_assets.clear)
+
+
+def load_thumbnail_asset(path):
+    key = (path, os.stat(path).st_mtime_ns)
+    image = _thumbnail_assets.get(key)
+    if image is None:
+        image = Image.open(path)
+        image.load()
+        _thumbnail_assets[key] = image
+    return image, key
+
+
+# ----- Gabarits de thumbnail -----
+#
+# Un gabarit JSON (thumbnail/layouts/) decrit les sprites, les calques fixes
+# et les textes. Les positions et tailles sont des expressions arithmetiques
+# sur W/H (taille du fond), w/h (taille de l'element) et {nom}_x/_y/_w/_h
+# des calques deja places; les textes ont aussi text_w/text_h. Le gabarit
+# est compile une fois par fond: tout ce qui ne depend pas de la ligne
+# devient une constante. Les sprites sont colles sous les calques fixes.
+
+THUMBNAIL_LAYOUT = "thumbnail/layouts/default.json"
+LAYOUT_FUNCTIONS = {"int": int, "round": round, "min": min, "max": max}
+LAYOUT_NODES = (
+    ast.Expression,
+    ast.BinOp,
+    ast.UnaryOp,
+    ast.Call,
+    ast.Name,
+    ast.Load,
+    ast.Constant,
+    ast.Add,
+    ast.Sub,
+    ast.Mult,
+    ast.Div,
+    ast.FloorDiv,
+    ast.Mod,
+    ast.UAdd,
+    ast.USub,
+)
+
+_layouts = {}
+_compiled_layouts = {}
+_THUMBNAIL_CACHE_CLEARERS.append(_layouts.clear)
+_THUMBNAIL_CACHE_CLEARERS.append(_compiled_layouts.clear)
+
+
+def compile_layout_expression(source):
+    tree = ast.parse(str(source), mode="eval")
+    for node in ast.walk(tree):
+        valid = isinstance(node, LAYOUT_NODES)
+        if isinstance(node, ast.Constant):
+            valid = isinstance(node.value, (int, float))
+        elif isinstance(node, ast.Call):
+            valid = (
+                isinstance(node.func, ast.Name)
+                and node.func.id in LAYOUT_FUNCTIONS
+                and not node.keywords
+            )
+        if not valid:
+            raise ValueError(f"Expression de gabarit invalide: {source}")
+    names = {node.id for node in ast.walk(tree) if isinstance(node, ast.Name)}
+    return compile(tree, "<gabarit>", "eval"), names - set(LAYOUT_FUNCTIONS)
+
+
+def evaluate_layout_expression(expression, variables):
+    code, _ = expression
+    return eval(code, {"__builtins__": {}, **LAYOUT_FUNCTIONS}, variables)
 
-    if player2_skin != "random":
-        player2_img = player2_img.transpose(Image.FLIP_LEFT_RIGHT)
 
-    p1_position = (int(width * 0.000005) - 20, int(height * 0.05) - 25)
-    p2_position = (
-        int(width * 1.05 - player2_img.width) - 20,
-        int(height * 0.05) - 25,
+def bind_layout_expression(expression, variables):
+    # Pliee en constante si toutes les variables sont connues a la
+    # compilation, sinon evaluee a chaque ligne avec les variables manquantes.
+    code, names = expression
+    variables = dict(variables)
+    if names <= variables.keys():
+        value = evaluate_layout_expression(expression, variables)
+        return lambda **_: value
+    return lambda **extra: evaluate_layout_expression(
+        expression, {**variables, **extra}
     )
 
-    if player1_img.mode == "RGBA":
-        background.paste(player1_img, p1_position, player1_img)
-    else:
-        background.paste(player1_img, p1_position)
 
-    if player2_img.mode == "RGBA":
-        background.paste(player2_img, p2_position, player2_img)
-    else:
-        background.paste(player2_img, p2_position)
+def load_layout(layout_path=THUMBNAIL_LAYOUT):
+    key = (layout_path, os.stat(layout_path).st_mtime_ns)
+    layout = _layouts.get(key)
+    if layout is not None:
+        return layout, key
+    with open(layout_path, "r", encoding="utf-8") as f:
+        template = json.load(f)
 
-    bar_position = (int(width * 0.5 - center_bar.width / 2), 0)
-    if center_bar.mode == "RGBA":
-        background.paste(center_bar, bar_position, center_bar)
-    else:
-        background.paste(center_bar, bar_position)
+    def expressions(item, fields):
+        item = dict(item)
+        for field in fields:
+            item[field] = compile_layout_expression(item[field])
+        return item
+
+    layout = {
+        "sprite_height": compile_layout_expression(template["sprite_height"]),
+        "sprites": [expressions(s, ["x", "y"]) for s in template["sprites"]],
+        "layers": [expressions(l, ["x", "y"]) for l in template["layers"]],
+        "texts": [],
+    }
+    for text in template["texts"]:
+        text = expressions(text, ["x", "y", "size"])
+        if "fit" in text:
+            text["fit"] = expressions(text["fit"], ["max_width"])
+        layout["texts"].append(text)
+    _layouts[key] = layout
+    return layout, key
 
-    logo_position = (
-        int(width * 0.5 - center_logo_img.width / 2),
-        int(height * 0.5 - center_logo_img.height / 2) - 50,
+
+def layout_sprite_height(layout, size):
+    return evaluate_layout_expression(
+        layout["sprite_height"], {"W": size[0], "H": size[1]}
     )
-    if center_logo_img.mode == "RGBA":
-        background.paste(center_logo_img, logo_position, center_logo_img)
-    else:
-        background.paste(center_logo_img, logo_position)
 
-    brush_position = (int(width * 0.5 - brush.width / 2), int(height * 0.68))
-    background.paste(brush, brush_position, brush)
 
-    try:
-        font_path = "thumbnail/font/Felipa-Regular.ttf"
-        set_font_path = "thumbnail/font/ssbu.ttf"
-        max_text_width = int(brush.width * 0.4)
-        base_player_font_size = int(height * 0.12)
-        player1_font_size = get_font_size_for_text(
-            player1_name, max_text_width, font_path, base_player_font_size
-        )
-        player2_font_size = get_font_size_for_text(
-            player2_name, max_text_width, font_path, base_player_font_size
-        )
-        player1_font = ImageFont.truetype(font_path, player1_font_size)
-        player2_font = ImageFont.truetype(font_path, player2_font_size)
-        set_font = ImageFont.truetype(set_font_path, int(height * 0.11))
-        draw = ImageDraw.Draw(background)
-        text_color = "#F79FC8"
-        set_text_color = "#5e0830"
-        set_border_color = "#F79FC8"
-        brush_center_x = width // 2
-        brush_y = brush_position[1]
-        player1_text_width = draw.textlength(player1_name, font=player1_font)
-        player2_text_width = draw.textlength(player2_name, font=player2_font)
-        player1_bbox = draw.textbbox((0, 0), player1_name, font=player1_font)
-        player2_bbox = draw.textbbox((0, 0), player2_name, font=player2_font)
-        player1_text_height = player1_bbox[3] - player1_bbox[1]
-        player2_text_height = player2_bbox[3] - player2_bbox[1]
-        player1_y = brush_y + (brush.height - player1_text_height) // 2 + 20
-        player2_y = brush_y + (brush.height - player2_text_height) // 2 + 20
-        player1_x = brush_center_x - brush.width // 4 - player1_text_width // 2 - 15
-        player2_x = brush_center_x + brush.width // 4 - player2_text_width // 2
-        draw.text(
-            (player1_x, player1_y),
-            player1_name,
-            fill=text_color,
-            font=player1_font,
-            stroke_width=3,
-            stroke_fill=set_text_color,
-        )
-        draw.text(
-            (player2_x, player2_y),
-            player2_name,
-            fill=text_color,
-            font=player2_font,
-            stroke_width=3,
-            stroke_fill=set_text_color,
-        )
-        set_text_width = draw.textlength(set_name, font=set_font)
-        set_pos = (width / 2 - set_text_width / 2, int(height * 0.025) - 10)
-        draw.text(
-            set_pos,
-            set_name,
-            fill=set_text_color,
-            font=set_font,
-            stroke_width=3,
-            stroke_fill=set_border_color,
+def compile_layout(layout, layout_key, layers):
+    background = layers["background"][0]
+    cache_key = (layout_key, background.size) + tuple(
+        layers[name][1] for name in sorted(layers) if name != "layout"
+    )
+    compiled = _compiled_layouts.get(cache_key)
+    if compiled is not None:
+        return compiled
+    width, height = background.size
+    variables = {"W": width, "H": height}
+    shared = []
+    for layer in layout["layers"]:
+        image, _ = layers[layer["name"]]
+        local = dict(variables, w=image.width, h=image.height)
+        x = evaluate_layout_expression(layer["x"], local)
+        y = evaluate_layout_expression(layer["y"], local)
+        name = layer["name"]
+        variables.update({f"{name}_x": x, f"{name}_y": y, f"{name}_w": image.width})
+        variables[f"{name}_h"] = image.height
+        shared.append((image, (x, y)))
+    sprites = [
+        {
+            "slot": sprite["slot"],
+            "mirrored": sprite.get("mirrored", False),
+            "x": bind_layout_expression(sprite["x"], variables),
+            "y": bind_layout_expression(sprite["y"], variables),
+        }
+        for sprite in layout["sprites"]
+    ]
+    texts = []
+    for text in layout["texts"]:
+        fit = text.get("fit")
+        texts.append(
+            {
+                "slot": text["slot"],
+                "font": text["font"],
+                "size": evaluate_layout_expression(text["size"], variables),
+                "max_width": (
+                    evaluate_layout_expression(fit["max_width"], variables)
+                    if fit
+                    else None
+                ),
+                "min_size": fit.get("min_size", 20) if fit else None,
+                "fill": text["fill"],
+                "stroke_fill": text.get("stroke_fill"),
+                "stroke_width": text.get("stroke_width", 0),
+                "x": bind_layout_expression(text["x"], variables),
+                "y": bind_layout_expression(text["y"], variables),
+            }
         )
-    except Exception as e:
-        safe_print(f"Erreur lors de l'ajout du texte: {e}", log_queue=log_queue)
-        draw = ImageDraw.Draw(background)
-        draw.text((p1_position[0], int(height * 0.75)), player1_name, fill=text_color)
-        draw.text((p2_position[0], int(height * 0.75)), player2_name, fill=text_color)
-        draw.text((width / 2 - 100, int(height * 0.2)), set_name, fill=text_color)
-    background.save(output_path)
-    safe_print(f"[OK] Thumbnail generee: {output_path}", log_queue=log_queue)
-    return True
+    compiled = {
+        "size": (width, height),
+        "sprite_height": layout_sprite_height(layout, (width, height)),
+        "sprites": sprites,
+        "shared": shared,
+        "texts": texts,
+    }
+    _compiled_layouts[cache_key] = compiled
+    return compiled
 
 
-def get_video_info(input_video_path, log_queue=None):
+def load_thumbnail_layers(
+    background_path, center_logo, layout_path=THUMBNAIL_LAYOUT, log_queue=None
+):
     try:
-        probe = ffmpeg.probe(input_video_path)
-        video_stream = next(
-            (stream for stream in probe["streams"] if stream["codec_type"] == "video"),
-            None,
-        )
-        audio_stream = next(
-            (stream for stream in probe["streams"] if stream["codec_type"] == "audio"),
-            None,
-        )
-        fps = eval(video_stream["r_frame_rate"]) if video_stream else None
-        has_audio = audio_stream is not None
-        duration = float(probe["format"]["duration"])
-        return {"fps": fps, "has_audio": has_audio, "duration": duration}
+        layout, layout_key = load_layout(layout_path)
     except Exception as e:
         safe_print(
-            f"Erreur lors de l'obtention des infos video: {e}", log_queue=log_queue
+            f"Erreur lors du chargement du gabarit {layout_path}: {e}",
+            log_queue=log_queue,
         )
         return None
-
-
-def extract_clips_ffmpeg(input_video_path, clips_data, temp_dir, log_queue=None):
-    temp_files = []
-    for i, (start_sec, end_sec) in enumerate(clips_data):
-        temp_file = os.path.join(temp_dir, f"temp_clip_{i}.mp4")
+    layers = {}
+    for name, path in [("background", background_path), ("center_logo", center_logo)]:
         try:
+            layers[name] = load_thumbnail_asset(path)
+        except Exception as e:
             safe_print(
-                f"Extraction clip {i+1}: {start_sec}s -> {end_sec}s",
-                log_queue=log_queue,
-            )
-            input_stream = ffmpeg.input(
-                input_video_path, ss=start_sec, t=end_sec - start_sec
-            )
-            output_stream = ffmpeg.output(
-                input_stream,
-                temp_file,
-                vcodec="libx264",
-                acodec="aac",
-                r=59.75,
-                ar=48000,
-                preset="ultrafast",
-                avoid_negative_ts="make_zero",
+                f"Erreur lors de l'ouverture de {name}: {e}", log_queue=log_queue
             )
-            ffmpeg.run(output_stream, overwrite_output=True, quiet=True)
-            temp_files.append(temp_file)
+            return None
+    for layer in layout["layers"]:
+        if "path" not in layer:
+            continue
+        try:
+            layers[layer["name"]] = load_thumbnail_asset(layer["path"])
         except Exception as e:
             safe_print(
-                f"Erreur lors de l'extraction du clip {i+1}: {e}", log_queue=log_queue
+                f"Erreur lors de l'ouverture de {layer['name']}: {e}",
+                log_queue=log_queue,
             )
-            continue
-    return temp_files
+            return None
+    try:
+        layers["layout"] = compile_layout(layout, layout_key, layers)
+    except Exception as e:
+        safe_print(
+            f"Erreur lors de la compilation du gabarit {layout_path}: {e}",
+            log_queue=log_queue,
+        )
+        return None
+    return layers
 
 
-def concatenate_clips_ffmpeg(temp_files, output_path, log_queue=None):
-    if not temp_files:
-        safe_print("Aucun clip a concatener", log_queue=log_queue)
-        return False
-    if len(temp_files) == 1:
-        try:
-            input_stream = ffmpeg.input(temp_files[0])
-            output_stream = ffmpeg.output(
-                input_stream, output_path, vcodec="copy", acodec="copy"
-            )
-            ffmpeg.run(output_stream, overwrite_output=True, quiet=True)
-            return True
-        except Exception as e:
+def plan_thumbnail(layers, row, sprites_dir, log_queue=None):
+    # Remplit le gabarit compile avec les sprites de la ligne. Le sprite
+    # "random" n'est jamais retourne.
+    layout = layers["layout"]
+    skin_height = layout["sprite_height"]
+    sprites = []
+    positions = {}
+    for slot in layout["sprites"]:
+        skin = row[f"{slot['slot']}_skin"]
+        mirrored = slot["mirrored"] and skin != "random"
+        sprite = load_scaled_character(
+            skin, sprites_dir, skin_height, mirrored=mirrored, log_queue=log_queue
+        )
+        if not sprite:
+            skins = ", ".join(row[f"{s['slot']}_skin"] for s in layout["sprites"])
             safe_print(
-                f"Erreur lors de la copie du clip unique: {e}", log_queue=log_queue
+                f"Impossible de charger les images des skins: {skins}",
+                log_queue=log_queue,
             )
-            return False
-    concat_file = "temp_concat_list.txt"
+            return None
+        image, offset, full_width = sprite
+        # Les sprites sont rognes a leur boite alpha: on les colle decales de
+        # leur offset pour garder le placement de l'image complete.
+        position = (
+            slot["x"](w=full_width, h=skin_height),
+            slot["y"](w=full_width, h=skin_height),
+        )
+        positions[slot["slot"]] = position
+        sprites.append((image, (position[0] + offset[0], position[1] + offset[1])))
+    return {
+        "sprites": sprites,
+        "shared": layout["shared"],
+        "texts": layout["texts"],
+        "positions": positions,
+        "size": layout["size"],
+    }
+
+
+def composite_thumbnail_pillow(background, plan):
+    for image, position in plan["sprites"]:
+        background.paste(image, position, image)
+    for image, position in plan["shared"]:
+        if image.mode == "RGBA":
+            background.paste(image, position, image)
+        else:
+            background.paste(image, position)
+    return background
+
+
+# ----- Texte des thumbnails -----
+#
+# Les memes joueurs et noms de set reviennent d'une ligne a l'autre: chaque
+# label est rasterise une fois en deux masques L (contour et remplissage)
+# puis colle a sa position. Coller une couleur a travers un masque donne
+# exactement les pixels de draw.text. Les masques sont aussi gardes sur
+# disque (un PNG LA par label) pour les executions suivantes. Le cache en
+# memoire est partage par le pipeline et l'apercu: il est protege par un
+# verrou. Sur disque, seuls les TEXT_CACHE_MAX_FILES labels utilises le plus
+# recemment sont gardes (un label relu est touche).
+
+TEXT_CACHE_DIR = os.path.join(CACHE_DIR, "text")
+TEXT_LABEL_CACHE_SIZE = 256
+TEXT_CACHE_MAX_FILES = 4096
+TEXT_CACHE_PRUNE_EVERY = 256
+
+_fonts = {}
+_font_sizes = {}
+_text_labels = {}
+_text_label_lock = threading.Lock()
+_text_label_saves = 0
+_text_metrics = {}
+_THUMBNAIL_CACHE_CLEARERS.append(_text_metrics.clear)
+_THUMBNAIL_CACHE_CLEARERS.append(_fonts.clear)
+_THUMBNAIL_CACHE_CLEARERS.append(_font_sizes.clear)
+_THUMBNAIL_CACHE_CLEARERS.append(_text_labels.clear)
+
+
+def get_font(font_path, font_size):
+    key = (font_path, font_size)
+    font = _fonts.get(key)
+    if font is None:
+        font = ImageFont.truetype(font_path, font_size)
+        _fonts[key] = font
+    return font
+
+
+def text_label_path(key):
+    font_path = key[1]
+    signature = repr(key + (os.stat(font_path).st_mtime_ns, Image.__version__))
+    digest = hashlib.sha1(signature.encode("utf-8")).hexdigest()[:20]
+    return os.path.join(TEXT_CACHE_DIR, f"{digest}.png")
+
+
+def load_text_label(path):
     try:
-        with open(concat_file, "w", encoding="utf-8") as f:
-            for temp_file in temp_files:
-                f.write(f"file '{os.path.abspath(temp_file)}'\n")
-        input_stream = ffmpeg.input(concat_file, format="concat", safe=0)
-        output_stream = ffmpeg.output(
-            input_stream,
-            output_path,
-            vcodec="libx264",
-            acodec="aac",
-            r=59.75,
-            ar=48000,
-            preset="ultrafast",
+        with Image.open(path) as cached:
+            cached.load()
+            offset = tuple(json.loads(cached.info["offset"]))
+    except (OSError, KeyError, ValueError):
+        return None
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    stroke_mask, fill_mask = cached.split()
+    return stroke_mask, fill_mask, offset
+
+
+def prune_text_cache():
+    labels = []
+    try:
+        for entry in os.scandir(TEXT_CACHE_DIR):
+            if entry.name.endswith(".png"):
+                labels.append((entry.stat().st_mtime, entry.path))
+    except OSError:
+        return
+    if len(labels) <= TEXT_CACHE_MAX_FILES:
+        return
+    labels.sort()
+    for _, path in labels[: len(labels) - TEXT_CACHE_MAX_FILES]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def save_text_label(path, label):
+    global _text_label_saves
+    stroke_mask, fill_mask, offset = label
+    info = PngImagePlugin.PngInfo()
+    info.add_text("offset", json.dumps(offset))
+    try:
+        os.makedirs(TEXT_CACHE_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        Image.merge("LA", (stroke_mask, fill_mask)).save(
+            tmp_path, "PNG", pnginfo=info, compress_level=1
         )
-        ffmpeg.run(output_stream, overwrite_output=True, quiet=True)
-        os.remove(concat_file)
-        return True
-    except Exception as e:
-        safe_print(f"Erreur lors de la concatenation: {e}", log_queue=log_queue)
-        if os.path.exists(concat_file):
-            os.remove(concat_file)
-        return False
+        os.replace(tmp_path, path)
+    except OSError:
+        return
+    with _text_label_lock:
+        _text_label_saves += 1
+        prune = _text_label_saves % TEXT_CACHE_PRUNE_EVERY == 1
+    if prune:
+        prune_text_cache()
+
+
+def render_text_label(text, font, stroke_width, start):
+    # Meme rasterisation que draw.text: le contour puis le texte, a la meme
+    # position fractionnaire, dessines en blanc sur un masque noir.
+    probe = ImageDraw.Draw(Image.new("L", (1, 1)))
+    bbox = probe.textbbox(start, text, font=font, stroke_width=stroke_width)
+    pad = max(0, -math.floor(bbox[0]), -math.floor(bbox[1])) + 1
+    size = (math.ceil(bbox[2]) + pad + 1, math.ceil(bbox[3]) + pad + 1)
+    xy = (pad + start[0], pad + start[1])
+    stroke_mask = Image.new("L", size)
+    ImageDraw.Draw(stroke_mask).text(
+        xy, text, fill=255, font=font, stroke_width=stroke_width
+    )
+    fill_mask = Image.new("L", size)
+    ImageDraw.Draw(fill_mask).text(xy, text, fill=255, font=font)
+    box = stroke_mask.getbbox() or (0, 0, 1, 1)
+    offset = (box[0] - pad, box[1] - pad)
+    return stroke_mask.crop(box), fill_mask.crop(box), offset
+
+
+def get_text_label(text, font_path, font_size, stroke_width, start, persist=True):
+    # La position fractionnaire change l'anticrenelage: elle fait partie de
+    # la cle. Les couleurs n'en font pas partie, elles sont appliquees au
+    # collage.
+    key = (text, font_path, font_size, stroke_width, start)
+    with _text_label_lock:
+        label = _text_labels.pop(key, None)
+        if label is not None:
+            _text_labels[key] = label
+            return label
+    path = text_label_path(key)
+    label = load_text_label(path) if os.path.exists(path) else None
+    if label is None:
+        font = get_font(font_path, font_size)
+        label = render_text_label(text, font, stroke_width, start)
+        if persist:
+            save_text_label(path, label)
+    with _text_label_lock:
+        _text_labels.pop(key, None)
+        while len(_text_labels) >= TEXT_LABEL_CACHE_SIZE:
+            del _text_labels[next(iter(_text_labels))]
+        _text_labels[key] = label
+    return label
+
+
+def draw_text_label(
+    image, xy, text, font_path, font_size, fill, stroke_fill, stroke_width, persist=True
+):
+    start = (math.modf(xy[0])[0], math.modf(xy[1])[0])
+    stroke_mask, fill_mask, offset = get_text_label(
+        text, font_path, font_size, stroke_width, start, persist
+    )
+    x = int(xy[0]) + offset[0]
+    y = int(xy[1]) + offset[1]
+    box = (x, y, x + stroke_mask.width, y + stroke_mask.height)
+    image.paste(stroke_fill, box, stroke_mask)
+    image.paste(fill, box, fill_mask)
+
+
+def measure_text(text, font_path, font_size):
+    key = (text, font_path, font_size)
+    metrics = _text_metrics.get(key)
+    if metrics is None:
+        font = get_font(font_path, font_size)
+        bbox = font.getbbox(text)
+        metrics = (font.getlength(text), bbox[3] - bbox[1])
+        _text_metrics[key] = metrics
+    return metrics
+
+
+def draw_thumbnail_text(background, plan, row, log_queue=None, persist=True):
+    for text in plan["texts"]:
+        value = row[text["slot"]]
+        try:
+            font_size = text["size"]
+            if text["max_width"] is not None:
+                font_size = get_font_size_for_text(
+                    value,
+                    text["max_width"],
+                    text["font"],
+                    font_size,
+                    text["min_size"],
+                )
+            text_w, text_h = measure_text(value, text["font"], font_size)
+            position = (
+                text["x"](text_w=text_w, text_h=text_h),
+                text["y"](text_w=text_w, text_h=text_h),
+            )
+            draw_text_label(
+                background,
+                position,
+                value,
+                text["font"],
+                font_size,
+                text["fill"],
+                text["stroke_fill"] or text["fill"],
+                text["stroke_width"],
+                persist,
+            )
+        except Exception as e:
+            safe_print(f"Erreur lors de l'ajout du texte: {e}", log_queue=log_queue)
+            width, height = plan["size"]
+            sprite_position = plan["positions"].get(text["slot"][: -len("_name")])
+            if sprite_position is not None:
+                position = (sprite_position[0], int(height * 0.75))
+            else:
+                position = (width / 2 - 100, int(height * 0.2))
+            ImageDraw.Draw(background).text(position, value, fill=text["fill"])
+
+
+# ----- Encodage des thumbnails -----
+
+# "quality" est ajustee (jpeg/webp) et "colors" reduit (png) jusqu'a tenir
+# dans le budget en octets. "png" garde la compression par defaut de Pillow;
+# "png-fast" encode plus vite mais ecrit des fichiers plus gros.
+THUMBNAIL_PROFILES = {
+    "png": {"format": "PNG", "ext": ".png", "options": {}},
+    "png-fast": {"format": "PNG", "ext": ".png", "options": {"compress_level": 1}},
+    "png-palette": {
+        "format": "PNG",
+        "ext": ".png",
+        "options": {"optimize": True},
+        "colors": 256,
+    },
+    "jpeg": {
+        "format": "JPEG",
+        "ext": ".jpg",
+        "options": {"quality": 92, "subsampling": 0},
+    },
+    "webp": {"format": "WEBP", "ext": ".webp", "options": {"quality": 90, "method": 4}},
+}
+THUMBNAIL_MIN_QUALITY = 40
+THUMBNAIL_MIN_COLORS = 16
+
+
+def encode_thumbnail(image, profile, quality=None, colors=None):
+    settings = THUMBNAIL_PROFILES[profile]
+    options = dict(settings["options"])
+    if settings["format"] == "JPEG":
+        image = image.convert("RGB")
+    if quality is not None:
+        options["quality"] = quality
+    if colors is not None:
+        image = image.quantize(colors, method=Image.Quantize.FASTOCTREE)
+    buffer = io.BytesIO()
+    image.save(buffer, settings["format"], **options)
+    return buffer.getvalue()
+
+
+def encode_thumbnail_within_budget(image, profile, max_bytes=None):
+    settings = THUMBNAIL_PROFILES[profile]
+    colors = settings.get("colors")
+    data = encode_thumbnail(image, profile, colors=colors)
+    if not max_bytes or len(data) <= max_bytes:
+        return data
+    if "quality" in settings["options"]:
+        # Recherche dichotomique de la meilleure qualite qui tient.
+        # Si rien ne tient, le plus petit essai est garde.
+        low, high = THUMBNAIL_MIN_QUALITY, settings["options"]["quality"] - 1
+        best = None
+        while low <= high:
+            quality = (low + high) // 2
+            candidate = encode_thumbnail(image, profile, quality=quality)
+            if len(candidate) <= max_bytes:
+                best, low = candidate, quality + 1
+            else:
+                data, high = min(data, candidate, key=len), quality - 1
+        return best or data
+    # PNG: passage en palette, de moins en moins de couleurs.
+    colors = colors // 2 if colors else 256
+    while True:
+        candidate = encode_thumbnail(image, profile, colors=colors)
+        data = min(data, candidate, key=len)
+        if len(candidate) <= max_bytes or colors <= THUMBNAIL_MIN_COLORS:
+            return data
+        colors //= 2
+
+
+def save_thumbnail(image, output_path, profile="png", max_bytes=None, log_queue=None):
+    start = time.perf_counter()
+    data = encode_thumbnail_within_budget(image, profile, max_bytes)
+    elapsed = time.perf_counter() - start
+    with open(output_path, "wb") as f:
+        f.write(data)
+    safe_print(
+        f"Encodage {profile}: {len(data) / 1024:.0f} Ko en {elapsed * 1000:.0f} ms",
+        log_queue=log_queue,
+    )
+    if max_bytes and len(data) > max_bytes:
+        safe_print(
+            f"Attention: budget de {max_bytes / 1024:.0f} Ko depasse pour {output_path}",
+            log_queue=log_queue,
+        )
+
+
+def create_thumbnail(
+    background_path,
+    player1_skin,
+    player1_name,
+    player2_skin,
+    player2_name,
+    set_name,
+    output_path,
+    sprites_dir="thumbnail/sprites",
+    reset_thumbnails=False,
+    center_logo="thumbnail/assets/LogoBC/LogoBC16.png",
+    log_queue=None,
+    thumbnail_profile="png",
+    thumbnail_max_bytes=None,
+    layout_path=THUMBNAIL_LAYOUT,
+    source_video=None,
+    background_time=None,
+):
+    # Retourne le chemin ecrit, ou None. Avec background_time, le fond est
+    # l'image de source_video a cet instant.
+    row = {
+        "player1_skin": player1_skin,
+        "player1_name": player1_name,
+        "player2_skin": player2_skin,
+        "player2_name": player2_name,
+        "set_name": set_name,
+    }
+    layers = load_thumbnail_layers(
+        background_path, center_logo, layout_path, log_queue=log_queue
+    )
+    if layers is None:
+        return None
+    plan = plan_thumbnail(layers, row, sprites_dir, log_queue)
+    if plan is None:
+        return None
+    background = layers["background"][0]
+    if source_video and background_time is not None:
+        # Fond fixe si l'image de jeu ne peut pas etre lue.
+        background = (
+            gameplay_background(source_video, background_time, background, log_queue)
+            or background
+        )
+    image = composite_thumbnail_pillow(background.copy(), plan)
+    draw_thumbnail_text(image, plan, row, log_queue=log_queue)
+    output_path = (
+        os.path.splitext(output_path)[0] + THUMBNAIL_PROFILES[thumbnail_profile]["ext"]
+    )
+    if not reset_thumbnails:
+        output_path = get_unique_filename(output_path)
+    save_thumbnail(
+        image, output_path, thumbnail_profile, thumbnail_max_bytes, log_queue
+    )
+    safe_print(f"[OK] Thumbnail generee: {output_path}", log_queue=log_queue)
+    return output_path
+
+
+# ----- Apercu -----
+#
+# L'apercu du GUI garde le fond compose (fond, sprites et calques fixes) de
+# la derniere ligne rendue: quand seul un nom change, seul le texte est
+# redessine sur une copie, puis l'image est reduite par PREVIEW_REDUCE. Les
+# labels de l'apercu ne sont pas ecrits dans le cache disque (saisie en
+# cours). Le thread de l'apercu partage les caches memoire avec le pipeline:
+# ceux qui evincent (labels, packs de sprites, images de gameplay) ont leur
+# verrou, les autres ne font que des get/set de dict.
+
+PREVIEW_REDUCE = 2
+
+
+class ThumbnailPreview:
+    def __init__(
+        self,
+        background_path,
+        center_logo,
+        sprites_dir,
+        layout_path=THUMBNAIL_LAYOUT,
+        log_queue=None,
+    ):
+        self.sprites_dir = sprites_dir
+        self.log_queue = log_queue
+        self.layers = load_thumbnail_layers(
+            background_path, center_logo, layout_path, log_queue=log_queue
+        )
+        self.base_key = None
+        self.base = None
+        self.plan = None
+
+    def render(self, row):
+        if self.layers is None:
+            return None
+        layout = self.layers["layout"]
+        index = get_sprite_index(self.sprites_dir)
+        if index is not None:
+            row = dict(row)
+            for slot in layout["sprites"]:
+                skin = row[f"{slot['slot']}_skin"]
+                row[f"{slot['slot']}_skin"] = index.resolve(skin) or skin
+        key = tuple(row[f"{slot['slot']}_skin"] for slot in layout["sprites"])
+        if key != self.base_key:
+            plan = plan_thumbnail(self.layers, row, self.sprites_dir, self.log_queue)
+            if plan is None:
+                return None
+            self.base = composite_thumbnail_pillow(
+                self.layers["background"][0].copy(), plan
+            )
+            self.plan = plan
+            self.base_key = key
+        image = self.base.copy()
+        draw_thumbnail_text(image, self.plan, row, self.log_queue, persist=False)
+        return image.reduce(PREVIEW_REDUCE)
+
+
+# ----- Execution de ffmpeg -----
+#
+# Les commandes ffmpeg/ffprobe passent toutes par une boucle asyncio unique,
+# dans un thread de fond. Un semaphore borne le nombre de processus
+# simultanes, stderr est lu au fil de l'eau (progression via -progress,
+# dernieres lignes d'erreur gardees pour le message) et chaque job peut etre
+# annule ou interrompu par un delai. Les fonctions synchrones soumettent
+# leurs jobs a la boucle et attendent le resultat.
+
+FFMPEG_MAX_JOBS = max(2, (os.cpu_count() or 2) // 2)
+FFMPEG_TIMEOUT = None
+FFPROBE_TIMEOUT = 60
+FFMPEG_CANCEL_TIMEOUT = 5
+FFMPEG_PROGRESS_INTERVAL = 10.0
+FFMPEG_STDERR_LINES = 20
+FFMPEG_GLOBAL_ARGS = [
+    "-hide_banner",
+    "-nostats",
+    "-loglevel",
+    "error",
+    "-progress",
+    "pipe:2",
+]
+
+# Repartition des coeurs entre les encodages x264 simultanes: sans limite,
+# chaque ffmpeg lance un thread par coeur et les jobs paralleles se marchent
+# dessus. Un job qui demarre recoit sa part des coeurs libres selon le nombre
+# d'encodages en attente ou en cours (plafonne par FFMPEG_MAX_JOBS); le
+# dernier job d'un run recupere donc toute la machine. Les parts des jobs
+# deja lances ne changent pas, l'equilibre se refait a chaque depart. Une
+# part des coeurs (CPU_GUI_RESERVE) reste libre pour l'interface.
+CPU_GUI_RESERVE = 0.125
+
+
+class ThreadBudget:
+    def __init__(self, cores=None, reserve=CPU_GUI_RESERVE):
+        cores = cores or os.cpu_count() or 1
+        held = max(1, round(cores * reserve)) if reserve and cores > 2 else 0
+        self.total = cores - held
+        self.allocated = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, demand=1):
+        with self.lock:
+            free = self.total - sum(self.allocated.values())
+            share = self.total // max(1, demand)
+            threads = max(1, min(free, share))
+            token = object()
+            self.allocated[token] = threads
+        return token, threads
+
+    def release(self, token):
+        with self.lock:
+            self.allocated.pop(token, None)
+
+    @contextmanager
+    def reserve(self, demand=1):
+        token, threads = self.acquire(demand)
+        try:
+            yield threads
+        finally:
+            self.release(token)
+
+
+_ffmpeg_runner = None
+_ffmpeg_runner_lock = threading.Lock()
+
+
+class FFmpegRunner:
+    def __init__(self, max_jobs=FFMPEG_MAX_JOBS, cpu_reserve=CPU_GUI_RESERVE):
+        self.max_jobs = max_jobs
+        self.semaphore = None
+        self.budget = ThreadBudget(reserve=cpu_reserve)
+        self.encoders = 0
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(
+            target=self.loop.run_forever, name="ffmpeg-runner", daemon=True
+        )
+        self.thread.start()
+
+    async def run_async(
+        self,
+        args,
+        label=None,
+        duration=None,
+        timeout=FFMPEG_TIMEOUT,
+        capture_stdout=False,
+        log_queue=None,
+        encoder=False,
+        stderr_handler=None,
+    ):
+        # Le semaphore est cree dans la boucle qui l'utilise.
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.max_jobs)
+        if encoder:
+            self.encoders += 1
+        try:
+            async with self.semaphore:
+                token = None
+                if encoder:
+                    token, threads = self.budget.acquire(
+                        min(self.encoders, self.max_jobs)
+                    )
+                    if callable(args):
+                        args = args(threads)
+                    else:
+                        args = with_thread_args(args, threads)
+                try:
+                    stdout, errors, returncode = await self.execute(
+                        args,
+                        label,
+                        duration,
+                        timeout,
+                        capture_stdout,
+                        log_queue,
+                        stderr_handler,
+                    )
+                finally:
+                    if token is not None:
+                        self.budget.release(token)
+        finally:
+            if encoder:
+                self.encoders -= 1
+        if returncode != 0:
+            raise ffmpeg.Error(args[0], stdout, "\n".join(errors).encode("utf-8"))
+        return stdout
+
+    async def execute(
+        self,
+        args,
+        label,
+        duration,
+        timeout,
+        capture_stdout,
+        log_queue,
+        stderr_handler=None,
+    ):
+        process = await asyncio.create_subprocess_exec(
+            *args,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=(
+                asyncio.subprocess.PIPE
+                if capture_stdout
+                else asyncio.subprocess.DEVNULL
+            ),
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            stdout, errors = await asyncio.wait_for(
+                self.communicate(process, label, duration, log_queue, stderr_handler),
+                timeout,
+            )
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            raise
+        return stdout, errors, process.returncode
+
+    async def communicate(
+        self, process, label, duration, log_queue, stderr_handler=None
+    ):
+        stdout_task = None
+        if process.stdout is not None:
+            stdout_task = asyncio.ensure_future(process.stdout.read())
+        errors = collections.deque(maxlen=FFMPEG_STDERR_LINES)
+        last_report = time.monotonic()
+        async for raw_line in process.stderr:
+            line = raw_line.decode("utf-8", "replace").strip()
+            # Lignes propres a l'appelant (showinfo...), lues dans la boucle.
+            if stderr_handler is not None and stderr_handler(line):
+                continue
+            key, separator, value = line.partition("=")
+            if not separator or " " in key:
+                if line:
+                    errors.append(line)
+                continue
+            if key != "out_time_us" or not label or not duration:
+                continue
+            now = time.monotonic()
+            if now - last_report >= FFMPEG_PROGRESS_INTERVAL and value.isdigit():
+                last_report = now
+                percent = min(100.0, int(value) / 1e6 / duration * 100)
+                safe_print(f"{label}: {percent:.0f}%", log_queue=log_queue)
+        stdout = await stdout_task if stdout_task is not None else None
+        await process.wait()
+        return stdout, list(errors)
+
+    def submit(self, args, **kwargs):
+        # Retourne un concurrent.futures.Future.
+        return asyncio.run_coroutine_threadsafe(
+            self.run_async(args, **kwargs), self.loop
+        )
+
+    def run(self, args, **kwargs):
+        return self.submit(args, **kwargs).result()
+
+    def cancel_all(self):
+        # Retourne un Future termine quand tous les processus ont ete tues:
+        # a attendre avant de quitter, sinon le thread de la boucle peut
+        # mourir avec l'interpreteur avant les kills.
+        async def cancel():
+            current = asyncio.current_task()
+            tasks = [task for task in asyncio.all_tasks() if task is not current]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        return asyncio.run_coroutine_threadsafe(cancel(), self.loop)
+
+    def shutdown(self, timeout=FFMPEG_CANCEL_TIMEOUT):
+        try:
+            self.cancel_all().result(timeout)
+        except TimeoutError:
+            pass
+
+
+def get_ffmpeg_runner():
+    global _ffmpeg_runner
+    with _ffmpeg_runner_lock:
+        if _ffmpeg_runner is None:
+            _ffmpeg_runner = FFmpegRunner()
+        return _ffmpeg_runner
+
+
+def ffmpeg_args(output_stream):
+    args = ffmpeg.compile(output_stream, overwrite_output=True)
+    return args[:1] + FFMPEG_GLOBAL_ARGS + args[1:]
+
+
+def with_thread_args(args, threads):
+    # args vient de ffmpeg_args: [ffmpeg, ..., sortie, "-y"]. -threads est une
+    # option de sortie (threads x264), -filter_threads une option globale.
+    threads = str(threads)
+    return (
+        args[:1]
+        + ["-filter_threads", threads]
+        + args[1:-2]
+        + ["-threads", threads]
+        + args[-2:]
+    )
+
+
+def ffmpeg_error_message(error):
+    if isinstance(error, ffmpeg.Error) and error.stderr:
+        return error.stderr.decode("utf-8", "replace").strip().splitlines()[-1]
+    return str(error) or type(error).__name__
+
+
+def get_video_info(input_video_path, log_queue=None):
+    try:
+        stdout = get_ffmpeg_runner().run(
+            [
+                "ffprobe",
+                "-v",
+                "error",
+                "-show_format",
+                "-show_streams",
+                "-of",
+                "json",
+                input_video_path,
+            ],
+            timeout=FFPROBE_TIMEOUT,
+            capture_stdout=True,
+        )
+        probe = json.loads(stdout)
+        video_stream = next(
+            (stream for stream in probe["streams"] if stream["codec_type"] == "video"),
+            None,
+        )
+        audio_stream = next(
+            (stream for stream in probe["streams"] if stream["codec_type"] == "audio"),
+            None,
+        )
+        fps = eval(video_stream["r_frame_rate"]) if video_stream else None
+        has_audio = audio_stream is not None
+        duration = float(probe["format"]["duration"])
+        bit_rate = int(probe["format"].get("bit_rate", 0)) or None
+        return {
+            "fps": fps,
+            "has_audio": has_audio,
+            "duration": duration,
+            "bit_rate": bit_rate,
+        }
+    except Exception as e:
+        safe_print(
+            f"Erreur lors de l'obtention des infos video: {ffmpeg_error_message(e)}",
+            log_queue=log_queue,
+        )
+        return None
+
+
+# ----- Fonds tires de la VOD -----
+#
+# Au lieu de l'image de fond fixe, une thumbnail peut partir d'une image de
+# jeu du set: l'image est lue a GAMEPLAY_BACKGROUND_OFFSET secondes dans le
+# premier clip, decodee directement en rgb24 sur stdout (pas de fichier
+# temporaire) a la taille du fond, puis floutee et assombrie pour que sprites
+# et textes restent lisibles. Les images lues sont gardees par (source,
+# instant, taille), sous verrou (apercu et pipeline): un nouveau rendu ne
+# refait pas le seek.
+
+GAMEPLAY_BACKGROUND_OFFSET = 30.0
+GAMEPLAY_BLUR_RADIUS = 8
+GAMEPLAY_BRIGHTNESS = 0.55
+GAMEPLAY_FRAME_CACHE_SIZE = 32
+
+_gameplay_frames = {}
+_gameplay_frame_lock = threading.Lock()
+_THUMBNAIL_CACHE_CLEARERS.append(_gameplay_frames.clear)
+
+
+def gameplay_frame_time(clips, offset=GAMEPLAY_BACKGROUND_OFFSET):
+    # Au plus au milieu du premier clip s'il est plus court que le decalage.
+    if not clips:
+        return None
+    start, end = clips[0]
+    return start + min(offset, (end - start) / 2)
+
+
+def grab_frame(input_video_path, time_sec, size, log_queue=None):
+    width, height = size
+    # Remplit le cadre du fond puis recadre au centre.
+    output_stream = (
+        ffmpeg.input(input_video_path, ss=time_sec)
+        .video.filter("scale", width, height, force_original_aspect_ratio="increase")
+        .filter("crop", width, height)
+        .output("pipe:1", vframes=1, format="rawvideo", pix_fmt="rgb24")
+    )
+    try:
+        data = get_ffmpeg_runner().run(
+            ffmpeg_args(output_stream), capture_stdout=True, log_queue=log_queue
+        )
+    except Exception as e:
+        safe_print(
+            f"Erreur lors de la lecture de l'image a {time_sec:.1f}s: "
+            f"{ffmpeg_error_message(e)}",
+            log_queue=log_queue,
+        )
+        return None
+    if len(data) != width * height * 3:
+        safe_print(
+            f"Aucune image lue a {time_sec:.1f}s de {input_video_path}",
+            log_queue=log_queue,
+        )
+        return None
+    return Image.frombuffer("RGB", size, data)
+
+
+def get_gameplay_frame(input_video_path, time_sec, size, log_queue=None):
+    key = (file_signature(input_video_path), round(time_sec, 3), tuple(size))
+    with _gameplay_frame_lock:
+        frame = _gameplay_frames.pop(key, None)
+        if frame is not None:
+            _gameplay_frames[key] = frame
+            return frame
+    frame = grab_frame(input_video_path, time_sec, size, log_queue)
+    if frame is None:
+        return None
+    with _gameplay_frame_lock:
+        _gameplay_frames.pop(key, None)
+        while len(_gameplay_frames) >= GAMEPLAY_FRAME_CACHE_SIZE:
+            del _gameplay_frames[next(iter(_gameplay_frames))]
+        _gameplay_frames[key] = frame
+    return frame
+
+
+def gameplay_background(input_video_path, time_sec, background, log_queue=None):
+    # Meme taille et meme mode que le fond fixe: le gabarit compile reste
+    # valable.
+    frame = get_gameplay_frame(input_video_path, time_sec, background.size, log_queue)
+    if frame is None:
+        return None
+    frame = frame.filter(ImageFilter.GaussianBlur(GAMEPLAY_BLUR_RADIUS))
+    frame = frame.point(lambda value: int(value * GAMEPLAY_BRIGHTNESS))
+    return frame.convert(background.mode)
+
+
+# ----- Espace temporaire -----
+
+# Les clips intermediaires sont encodes en x264 ultrafast, plus gros que la
+# source: l'estimation prend une marge sur le debit source.
+SCRATCH_BITRATE_FACTOR = 2.0
+SCRATCH_DEFAULT_BITRATE = 20_000_000
+SCRATCH_FREE_MARGIN = 512 * 1024 * 1024
+
+
+class ScratchManager:
+    def __init__(self, scratch_dir, free_margin=SCRATCH_FREE_MARGIN):
+        self.scratch_dir = scratch_dir
+        self.free_margin = free_margin
+        self.reserved = 0
+        self.condition = threading.Condition()
+        os.makedirs(scratch_dir, exist_ok=True)
+
+    def estimate_bytes(self, clips_data, bit_rate=None):
+        duration = sum(end_sec - start_sec for start_sec, end_sec in clips_data)
+        bit_rate = bit_rate or SCRATCH_DEFAULT_BITRATE
+        return int(duration * bit_rate / 8 * SCRATCH_BITRATE_FACTOR)
+
+    def available_bytes(self):
+        free = shutil.disk_usage(self.scratch_dir).free
+        return free - self.free_margin - self.reserved
+
+    def acquire(self, name, needed_bytes, log_queue=None):
+        # Reserve l'espace estime puis fournit un dossier propre au job.
+        with self.condition:
+            while needed_bytes > self.available_bytes():
+                if not self.reserved:
+                    raise OSError(
+                        f"Espace insuffisant dans {self.scratch_dir}: "
+                        f"{needed_bytes / 1e9:.2f} Go requis, "
+                        f"{max(0, self.available_bytes()) / 1e9:.2f} Go disponibles"
+                    )
+                safe_print(
+                    f"Espace temporaire insuffisant, {name} en attente...",
+                    log_queue=log_queue,
+                )
+                self.condition.wait()
+            self.reserved += needed_bytes
+        return tempfile.mkdtemp(prefix="set_", dir=self.scratch_dir)
+
+    def release(self, job_dir, needed_bytes):
+        # Supprime le dossier du job avec les intermediaires restants.
+        shutil.rmtree(job_dir, ignore_errors=True)
+        with self.condition:
+            self.reserved -= needed_bytes
+            self.condition.notify_all()
+
+    @contextmanager
+    def job(self, name, needed_bytes, log_queue=None):
+        job_dir = self.acquire(name, needed_bytes, log_queue)
+        try:
+            yield job_dir
+        finally:
+            self.release(job_dir, needed_bytes)
+
+
+# ----- Decoupe des clips -----
+#
+# Les plages d'un set separees de moins de CLIP_MERGE_GAP secondes (coupure
+# de stream, pause courte) sont lues en un seul decodage: une entree qui
+# couvre tout le groupe, puis trim/atrim et concat dans le graphe de filtres.
+# Le trou entre deux plages est decode mais jete, ce qui coute moins qu'un
+# processus, un seek et un passage de concatenation de plus.
+
+CLIP_MERGE_GAP = 10.0
+
+
+def find_clip_overlaps(clips_data):
+    # Paires (numeros de clip, a partir de 1) dont les plages se chevauchent.
+    overlaps = []
+    latest = None
+    for i, (start_sec, end_sec) in sorted(
+        enumerate(clips_data, 1), key=lambda clip: clip[1]
+    ):
+        if latest is not None and start_sec < latest[1]:
+            overlaps.append((latest[0], i))
+        if latest is None or end_sec > latest[1]:
+            latest = (i, end_sec)
+    return overlaps
+
+
+def plan_cuts(clips_data, max_gap=CLIP_MERGE_GAP):
+    # Groupes de plages consecutives (dans l'ordre du set) a lire d'un coup.
+    groups = []
+    for start_sec, end_sec in clips_data:
+        if groups and 0 <= start_sec - groups[-1][-1][1] <= max_gap:
+            groups[-1].append((start_sec, end_sec))
+        else:
+            groups.append([(start_sec, end_sec)])
+    return groups
+
+
+def cut_duration(group):
+    return sum(end_sec - start_sec for start_sec, end_sec in group)
+
+
+def cut_name(index, group):
+    if len(group) == 1:
+        return f"clip {index}"
+    return f"clips {index}-{index + len(group) - 1}"
+
+
+def describe_cut(index, group):
+    ranges = ", ".join(f"{start}s -> {end}s" for start, end in group)
+    if len(group) == 1:
+        return f"{cut_name(index, group)}: {ranges}"
+    return f"{cut_name(index, group)} en une passe: {ranges}"
+
+
+def cut_streams(input_video_path, group, has_audio=True):
+    # Flux a passer a ffmpeg.output pour un groupe de plages.
+    group_start = group[0][0]
+    input_stream = ffmpeg.input(
+        input_video_path, ss=group_start, t=group[-1][1] - group_start
+    )
+    if len(group) == 1:
+        if has_audio:
+            return [input_stream.video, input_stream.audio]
+        return [input_stream.video]
+    segments = []
+    for start_sec, end_sec in group:
+        trim = {"start": start_sec - group_start, "end": end_sec - group_start}
+        segments.append(input_stream.video.trim(**trim).setpts("PTS-STARTPTS"))
+        if has_audio:
+            segments.append(
+                input_stream.audio.filter("atrim", **trim).filter(
+                    "asetpts", "PTS-STARTPTS"
+                )
+            )
+    joined = ffmpeg.concat(*segments, v=1, a=1 if has_audio else 0).node
+    return [joined[0], joined[1]] if has_audio else [joined[0]]
+
+
+def extract_clips_ffmpeg(
+    input_video_path,
+    clips_data,
+    temp_dir,
+    log_queue=None,
+    set_name=None,
+    has_audio=True,
+):
+    # Tous les groupes du set sont soumis d'un coup; le semaphore du runner
+    # limite le nombre d'extractions simultanees.
+    runner = get_ffmpeg_runner()
+    jobs = []
+    index = 1
+    for i, group in enumerate(plan_cuts(clips_data)):
+        temp_file = os.path.join(temp_dir, f"temp_clip_{i}.mp4")
+        name = cut_name(index, group)
+        safe_print(f"Extraction {describe_cut(index, group)}", log_queue=log_queue)
+        index += len(group)
+        output_stream = ffmpeg.output(
+            *cut_streams(input_video_path, group, has_audio),
+            temp_file,
+            vcodec="libx264",
+            acodec="aac",
+            r=59.75,
+            ar=48000,
+            preset="ultrafast",
+            avoid_negative_ts="make_zero",
+        )
+        future = runner.submit(
+            ffmpeg_args(output_stream),
+            label=f"{set_name or temp_dir}: extraction {name}",
+            duration=cut_duration(group),
+            log_queue=log_queue,
+            encoder=True,
+        )
+        jobs.append((temp_file, name, future))
+    temp_files = []
+    for temp_file, name, future in jobs:
+        try:
+            future.result()
+            temp_files.append(temp_file)
+        except Exception as e:
+            safe_print(
+                f"Erreur lors de l'extraction {name}: {ffmpeg_error_message(e)}",
+                log_queue=log_queue,
+            )
+    return temp_files
+
+
+# ----- Rendus -----
+#
+# Un set peut etre publie en plusieurs rendus (1080p, 720p, apercu...). Tous
+# les rendus sortent du meme ffmpeg: le flux est decode une seule fois puis
+# duplique (split/asplit) vers une branche scale + encodeur par rendu. Le
+# rendu "source" garde les reglages historiques (resolution d'origine) et
+# ecrit sous le nom du set sans suffixe.
+
+RENDITION_DEFAULTS = {
+    "vcodec": "libx264",
+    "acodec": "aac",
+    "r": 59.75,
+    "ar": 48000,
+    "preset": "ultrafast",
+}
+RENDITION_OPTIONS = list(RENDITION_DEFAULTS) + ["video_bitrate", "audio_bitrate"]
+RENDITION_PROFILES = {
+    "source": {"suffix": ""},
+    "1080p": {
+        "suffix": "_1080p",
+        "height": 1080,
+        "video_bitrate": "8M",
+        "audio_bitrate": "192k",
+        "preset": "veryfast",
+    },
+    "720p": {
+        "suffix": "_720p",
+        "height": 720,
+        "video_bitrate": "4M",
+        "audio_bitrate": "160k",
+        "preset": "veryfast",
+    },
+    "preview": {
+        "suffix": "_preview",
+        "height": 360,
+        "video_bitrate": "600k",
+        "audio_bitrate": "96k",
+        "r": 30,
+        "preset": "veryfast",
+    },
+}
+DEFAULT_RENDITIONS = ["source"]
+
+
+def resolve_renditions(renditions):
+    # Noms de RENDITION_PROFILES ou profils explicites (dict avec "name").
+    resolved = []
+    for rendition in renditions or DEFAULT_RENDITIONS:
+        if isinstance(rendition, str):
+            if rendition not in RENDITION_PROFILES:
+                raise ValueError(f"Rendu inconnu: {rendition}")
+            profile = dict(RENDITION_PROFILES[rendition], name=rendition)
+        else:
+            profile = dict(rendition)
+            profile.setdefault("suffix", f"_{profile['name']}")
+        resolved.append(profile)
+    suffixes = [profile["suffix"] for profile in resolved]
+    if len(set(suffixes)) != len(suffixes):
+        raise ValueError("Deux rendus ecrivent le meme fichier")
+    return resolved
+
+
+def rendition_path(video_path, profile):
+    root, ext = os.path.splitext(video_path)
+    return f"{root}{profile['suffix']}{ext}"
+
+
+def rendition_options(profile):
+    options = dict(RENDITION_DEFAULTS)
+    options.update({key: profile[key] for key in RENDITION_OPTIONS if key in profile})
+    return options
+
+
+def is_copy_rendition(profile):
+    # Memes reglages que les clips intermediaires: une copie suffit.
+    return not profile.get("height") and rendition_options(profile) == (
+        RENDITION_DEFAULTS
+    )
+
+
+def rendition_outputs(video, audio, outputs, threads=None, **options):
+    # outputs: [(chemin, profil)]. Les threads x264 du job sont repartis
+    # entre les encodeurs.
+    count = len(outputs)
+    videos, audios = [video], [audio]
+    if count > 1:
+        split = video.filter_multi_output("split", count)
+        videos = [split[i] for i in range(count)]
+        if audio is not None:
+            asplit = audio.filter_multi_output("asplit", count)
+            audios = [asplit[i] for i in range(count)]
+        else:
+            audios = [None] * count
+    if threads:
+        options["threads"] = max(1, threads // count)
+    streams = []
+    for (output_path, profile), video, audio in zip(outputs, videos, audios):
+        if profile.get("height"):
+            video = video.filter("scale", -2, profile["height"])
+        streams.append(
+            ffmpeg.output(
+                *[s for s in (video, audio) if s is not None],
+                output_path,
+                **rendition_options(profile),
+                **options,
+            )
+        )
+    return ffmpeg.merge_outputs(*streams)
+
+
+def rendition_args(video, audio, outputs, **options):
+    # Le runner appelle le constructeur avec les threads accordes au job.
+    def build(threads):
+        args = ffmpeg_args(rendition_outputs(video, audio, outputs, threads, **options))
+        return args[:1] + ["-filter_threads", str(threads)] + args[1:]
+
+    return build
+
+
+def concatenate_clips_ffmpeg(
+    temp_files,
+    output_path,
+    log_queue=None,
+    duration=None,
+    renditions=None,
+    has_audio=True,
+):
+    if not temp_files:
+        safe_print("Aucun clip a concatener", log_queue=log_queue)
+        return False
+    runner = get_ffmpeg_runner()
+    outputs = [
+        (rendition_path(output_path, profile), profile)
+        for profile in resolve_renditions(renditions)
+    ]
+    if len(temp_files) == 1 and len(outputs) == 1 and is_copy_rendition(outputs[0][1]):
+        try:
+            input_stream = ffmpeg.input(temp_files[0])
+            output_stream = ffmpeg.output(
+                input_stream, outputs[0][0], vcodec="copy", acodec="copy"
+            )
+            runner.run(ffmpeg_args(output_stream), log_queue=log_queue)
+            return True
+        except Exception as e:
+            safe_print(
+                f"Erreur lors de la copie du clip unique: {ffmpeg_error_message(e)}",
+                log_queue=log_queue,
+            )
+            return False
+    concat_file = os.path.join(os.path.dirname(temp_files[0]), "temp_concat_list.txt")
+    try:
+        with open(concat_file, "w", encoding="utf-8") as f:
+            for temp_file in temp_files:
+                f.write(f"file '{os.path.abspath(temp_file)}'\n")
+        input_stream = ffmpeg.input(concat_file, format="concat", safe=0)
+        runner.run(
+            rendition_args(
+                input_stream.video, input_stream.audio if has_audio else None, outputs
+            ),
+            label=f"Concatenation {os.path.basename(output_path)}",
+            duration=duration,
+            log_queue=log_queue,
+            encoder=True,
+        )
+        os.remove(concat_file)
+        return True
+    except Exception as e:
+        safe_print(
+            f"Erreur lors de la concatenation: {ffmpeg_error_message(e)}",
+            log_queue=log_queue,
+        )
+        if os.path.exists(concat_file):
+            os.remove(concat_file)
+        return False
+
+
+def stream_clips_ffmpeg(
+    input_video_path,
+    clips_data,
+    output_path,
+    log_queue=None,
+    has_audio=True,
+    renditions=None,
+):
+    # Tous les groupes du set sont lus par le meme ffmpeg (une entree avec
+    # seek rapide par groupe) et concatenes dans le graphe de filtres, juste
+    # avant les encodeurs: ni fichier temporaire ni encodage intermediaire.
+    if not clips_data:
+        safe_print("Aucun clip a concatener", log_queue=log_queue)
+        return False
+    outputs = [
+        (rendition_path(output_path, profile), profile)
+        for profile in resolve_renditions(renditions)
+    ]
+    groups = plan_cuts(clips_data)
+    segments = []
+    index = 1
+    for group in groups:
+        safe_print(f"Extraction {describe_cut(index, group)}", log_queue=log_queue)
+        index += len(group)
+        segments.extend(cut_streams(input_video_path, group, has_audio))
+    streams = segments
+    if len(groups) > 1:
+        joined = ffmpeg.concat(*segments, v=1, a=1 if has_audio else 0).node
+        streams = [joined[0], joined[1]] if has_audio else [joined[0]]
+    name = os.path.basename(output_path)
+    try:
+        get_ffmpeg_runner().run(
+            rendition_args(
+                streams[0],
+                streams[1] if has_audio else None,
+                outputs,
+                avoid_negative_ts="make_zero",
+            ),
+            label=f"Export {name}",
+            duration=cut_duration(clips_data),
+            log_queue=log_queue,
+            encoder=True,
+        )
+        return True
+    except Exception as e:
+        safe_print(
+            f"Erreur lors de l'export de {name}: {ffmpeg_error_message(e)}",
+            log_queue=log_queue,
+        )
+        return False
+
+
+# ----- Planification des sets -----
+#
+# Avant tout rendu, les lignes du CSV sont regroupees en sets: les lignes qui
+# partagent set_name et joueurs sont les parties d'un meme set (VOD coupee)
+# et leurs clips sont concatenes dans l'ordre du CSV (une plage deja vue
+# n'est pas reprise: une ligne en double ne compte qu'une fois). Chaque unite
+# de travail (thumbnail, video) est identifiee par le hash de ses entrees; le
+# manifeste du dossier de sortie retient le fichier produit pour chaque hash,
+# ce qui evite de refaire un rendu identique dans la meme execution ou une
+# suivante.
+# Le fichier existant est alors reutilise (lien physique, ou copie).
+
+PLAYER_FIELDS = ["player1_skin", "player1_name", "player2_skin", "player2_name"]
+DEDUP_MANIFEST_NAME = ".setsplitter_cache.json"
+
+
+def file_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+
+def hash_inputs(*parts):
+    return hashlib.sha1(json.dumps(parts, default=str).encode("utf-8")).hexdigest()
+
+
+def link_or_copy(source, target):
+    if os.path.exists(target):
+        if os.path.samefile(source, target):
+            return
+        os.remove(target)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+def unique_output_name(name, taken):
+    # Meme convention que get_unique_filename, pour les sets du plan qui
+    # auraient le meme nom.
+    candidate = name
+    counter = 1
+    while candidate in taken:
+        candidate = f"{name}_{counter}"
+        counter += 1
+    taken.add(candidate)
+    return candidate
+
+
+def plan_sets(df, output_dir, log_queue=None, sprites_dir=None):
+    sets = []
+    by_key = {}
+    for _, row in df.iterrows():
+        set_name = row["set_name"]
+        players = None
+        if all(field in row for field in PLAYER_FIELDS):
+            players = {field: row[field] for field in PLAYER_FIELDS}
+        else:
+            safe_print(
+                f"Donnees manquantes pour le set: {set_name}", log_queue=log_queue
+            )
+        clips_data = []
+        for i in range(1, 6):
+            start_sec = timecode_to_seconds(row.get(f"start{i}"))
+            end_sec = timecode_to_seconds(row.get(f"end{i}"))
+            if start_sec is not None and end_sec is not None and start_sec < end_sec:
+                clips_data.append((start_sec, end_sec))
+        key = hash_inputs(set_name, players)
+        if key in by_key:
+            # Une ligne en double (memes plages) n'est traitee qu'une fois;
+            # seules des plages nouvelles font une partie de plus.
+            job = by_key[key]
+            new_clips = [clip for clip in clips_data if clip not in job["clips"]]
+            if not new_clips:
+                safe_print(
+                    f"Set {set_name}: ligne en double ignoree", log_queue=log_queue
+                )
+                continue
+            job["parts"] += 1
+            job["clips"].extend(new_clips)
+            safe_print(
+                f"Set {set_name}: partie {job['parts']} fusionnee avec la precedente",
+                log_queue=log_queue,
+            )
+            continue
+        job = {
+            "set_name": set_name,
+            "players": players,
+            "clips": clips_data,
+            "parts": 1,
+        }
+        by_key[key] = job
+        sets.append(job)
+    # Une plage repetee a l'identique dans un set n'est gardee qu'une fois.
+    # Des plages qui se chevauchent sont une erreur de saisie: le set n'est
+    # pas exporte plutot que de contenir deux fois les memes images.
+    for job in sets:
+        clips = list(dict.fromkeys(job["clips"]))
+        if len(clips) < len(job["clips"]):
+            safe_print(
+                f"{job['set_name']}: {len(job['clips']) - len(clips)} plage(s) en "
+                "double ignoree(s)",
+                log_queue=log_queue,
+            )
+            job["clips"] = clips
+        overlaps = find_clip_overlaps(job["clips"])
+        if overlaps:
+            pairs = ", ".join(f"{i} et {j}" for i, j in overlaps)
+            safe_print(
+                f"[ERREUR] {job['set_name']}: les clips {pairs} se chevauchent, "
+                "set ignore",
+                log_queue=log_queue,
+            )
+            job["clips"] = []
+    if sprites_dir:
+        resolve_set_sprites(sets, sprites_dir, log_queue=log_queue)
+    # Un nom de fichier par set, partage par la video et la thumbnail.
+    taken = set()
+    for job in sets:
+        job["output_name"] = unique_output_name(str(job["set_name"]), taken)
+        job["video_path"] = os.path.join(output_dir, f"{job['output_name']}.mp4")
+    return sets
+
+
+class DedupManifest:
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, DEDUP_MANIFEST_NAME)
+        self.lock = threading.Lock()
+        self.entries = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def valid_paths(self, key):
+        # Fichiers encore presents et intacts produits pour ce hash.
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is None:
+            return []
+        paths = []
+        for relative_path in entry["paths"]:
+            path = os.path.normpath(os.path.join(self.output_dir, relative_path))
+            signature = file_signature(path)
+            if signature is not None and signature[1] == entry["size"]:
+                paths.append(path)
+        return paths
+
+    def lookup(self, key):
+        paths = self.valid_paths(key)
+        return paths[0] if paths else None
+
+    def is_current(self, key, path):
+        return os.path.normpath(path) in self.valid_paths(key)
+
+    def record(self, key, path):
+        size = os.path.getsize(path)
+        relative_path = os.path.relpath(path, self.output_dir)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry["size"] != size:
+                entry = {"size": size, "paths": []}
+                self.entries[key] = entry
+            if relative_path not in entry["paths"]:
+                entry["paths"].append(relative_path)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, indent=1)
+            os.replace(tmp_path, self.path)
+
+
+def reuse_output(manifest, key, output_path, log_queue=None):
+    # Retourne le chemin de sortie si le meme travail a deja ete fait.
+    existing = manifest.lookup(key)
+    if existing is None:
+        return None
+    link_or_copy(existing, output_path)
+    manifest.record(key, output_path)
+    safe_print(
+        f"[OK] Deja genere, reutilise: {existing} -> {output_path}",
+        log_queue=log_queue,
+    )
+    return output_path
+
+
+def thumbnail_job_key(job, settings):
+    players = job["players"]
+    sprites_dir = settings["sprites_dir"]
+    return hash_inputs(
+        "thumbnail",
+        job["set_name"],
+        players,
+        [
+            file_signature(os.path.join(sprites_dir, f"{players[field]}.png"))
+            for field in ["player1_skin", "player2_skin"]
+        ],
+        file_signature(settings["background_path"]),
+        file_signature(settings["center_logo"]),
+        file_signature(settings["layout_path"]),
+        settings["thumbnail_profile"],
+        settings["thumbnail_max_bytes"],
+        gameplay_background_inputs(job, settings),
+    )
+
+
+def gameplay_background_inputs(job, settings):
+    if settings["gameplay_offset"] is None or not settings["source_video"]:
+        return None
+    return (
+        file_signature(settings["source_video"]),
+        gameplay_frame_time(job["clips"], settings["gameplay_offset"]),
+        GAMEPLAY_BLUR_RADIUS,
+        GAMEPLAY_BRIGHTNESS,
+    )
+
+
+def video_job_key(job, input_video_path, stream_clips, profile):
+    return hash_inputs(
+        "video",
+        file_signature(input_video_path),
+        job["clips"],
+        stream_clips,
+        rendition_options(profile),
+        profile.get("height"),
+    )
+
+
+def thumbnail_job_path(job, thumbnail_dir, settings):
+    return os.path.join(
+        thumbnail_dir,
+        f"{job['output_name']}_thumbnail"
+        + THUMBNAIL_PROFILES[settings["thumbnail_profile"]]["ext"],
+    )
+
+
+def run_thumbnail_jobs(jobs, thumbnail_dir, manifest, settings, log_queue=None):
+    # Les thumbnails deja generees sont reutilisees, les autres sont rendues.
+    pending = []
+    for job in jobs:
+        key = thumbnail_job_key(job, settings)
+        output_path = thumbnail_job_path(job, thumbnail_dir, settings)
+        if manifest.is_current(key, output_path):
+            safe_print(
+                f"[OK] Thumbnail deja a jour: {output_path}", log_queue=log_queue
+            )
+            continue
+        if not settings["reset_thumbnails"]:
+            output_path = get_unique_filename(output_path)
+        if reuse_output(manifest, key, output_path, log_queue) is None:
+            pending.append((key, job, output_path))
+    for key, job, output_path in pending:
+        safe_print(f"Generation thumbnail pour: {job['set_name']}", log_queue=log_queue)
+        background_time = None
+        if settings["gameplay_offset"] is not None:
+            background_time = gameplay_frame_time(
+                job["clips"], settings["gameplay_offset"]
+            )
+        players = job["players"]
+        try:
+            path = create_thumbnail(
+                settings["background_path"],
+                players["player1_skin"],
+                players["player1_name"],
+                players["player2_skin"],
+                players["player2_name"],
+                job["set_name"],
+                output_path,
+                settings["sprites_dir"],
+                True,
+                settings["center_logo"],
+                log_queue=log_queue,
+                thumbnail_profile=settings["thumbnail_profile"],
+                thumbnail_max_bytes=settings["thumbnail_max_bytes"],
+                layout_path=settings["layout_path"],
+                source_video=settings["source_video"],
+                background_time=background_time,
+            )
+        except Exception as e:
+            safe_print(
+                "Erreur lors de la generation de la thumbnail pour "
+                f"{job['set_name']}: {e}",
+                log_queue=log_queue,
+            )
+            continue
+        if path:
+            manifest.record(key, path)
+
+
+def generate_thumbnails_only(
+    csv_path,
+    background_path,
+    output_dir="sets_output",
+    sprites_dir="thumbnail/sprites",
+    reset_thumbnails=False,
+    center_logo="thumbnail/assets/LogoBC/LogoBC16.png",
+    log_queue=None,
+    thumbnail_profile="png",
+    thumbnail_max_bytes=None,
+    layout_path=THUMBNAIL_LAYOUT,
+    source_video=None,
+    gameplay_offset=None,
+):
+    os.makedirs(output_dir, exist_ok=True)
+    thumbnail_dir = os.path.join(output_dir, "thumbnails")
+    os.makedirs(thumbnail_dir, exist_ok=True)
+    df = pd.read_csv(csv_path, encoding="utf-8")
+    safe_print("Mode generation de thumbnails uniquement", log_queue=log_queue)
+    safe_print(f"Dossier de sortie: {thumbnail_dir}", log_queue=log_queue)
+    settings = {
+        "background_path": background_path,
+        "sprites_dir": sprites_dir,
+        "reset_thumbnails": reset_thumbnails,
+        "center_logo": center_logo,
+        "thumbnail_profile": thumbnail_profile,
+        "thumbnail_max_bytes": thumbnail_max_bytes,
+        "layout_path": layout_path,
+        "source_video": source_video,
+        "gameplay_offset": gameplay_offset,
+    }
+    sets = plan_sets(df, output_dir, log_queue=log_queue, sprites_dir=sprites_dir)
+    run_thumbnail_jobs(
+        [job for job in sets if job["players"]],
+        thumbnail_dir,
+        DedupManifest(output_dir),
+        settings,
+        log_queue=log_queue,
+    )
+    safe_print("[OK] Generation des thumbnails terminee!", log_queue=log_queue)
+
+
+# ----- Pipeline des sets -----
+#
+# process_video enchaine des etages relies par des files bornees:
+#   plan -> thumbnail
+#        -> extract -> concat -> finalise
+# Chaque etage a ses propres workers: le rendu des thumbnails et la lecture
+# des clips avancent pendant que les encodeurs x264 travaillent, et les files
+# bornees empechent un etage rapide de prendre trop d'avance (et d'espace
+# temporaire). En mode flux, extract produit directement la video finale.
+
+PIPELINE_QUEUE_SIZE = 2
+PIPELINE_WORKERS = {"thumbnail": 1, "extract": 2, "concat": 1, "finalise": 1}
+
+# Ordonnancement des exports: le plus long d'abord (LPT) sur les workers,
+# pour qu'une Grand Final de 17 minutes ne demarre pas en dernier. Le cout
+# d'un set est modelise par deux termes: un cout fixe par passe de decoupe
+# et un cout par seconde encodee (duree des clips x debit source x nombre
+# d'encodages x264: en mode flux, un encodage par rendu; sinon une seule
+# passe vers un seul rendu fait un encodage, et plusieurs passes ou rendus
+# font les passes + un encodage final par rendu). Les deux coefficients sont
+# ajustes aux moindres carres sur les sets termines, a partir des valeurs
+# par defaut (deux observations fictives): un set fait de nombreux petits
+# clips peut ainsi passer devant un set plus long mais d'un seul tenant.
+SCHEDULER_CLIP_OVERHEAD = 1.0
+SCHEDULER_ENCODE_RATE = 0.3
+SCHEDULER_REFERENCE_BITRATE = 8_000_000
+SCHEDULER_PRIOR_WORK = 60.0
+
+
+class SetScheduler:
+    def __init__(self, bit_rate=None, workers=1, stream_clips=False, log_queue=None):
+        self.stream_clips = stream_clips
+        self.bitrate_factor = (bit_rate or SCRATCH_DEFAULT_BITRATE) / (
+            SCHEDULER_REFERENCE_BITRATE
+        )
+        self.workers = max(1, workers)
+        self.log_queue = log_queue
+        self.pending = []
+        self.lock = threading.Lock()
+        self.overhead = SCHEDULER_CLIP_OVERHEAD
+        self.rate = SCHEDULER_ENCODE_RATE
+        # Sommes des moindres carres sur (passes, travail) -> duree.
+        self.sums = {"cc": 0.0, "cw": 0.0, "ww": 0.0, "ct": 0.0, "wt": 0.0}
+        self.observe(1.0, 0.0, SCHEDULER_CLIP_OVERHEAD)
+        self.observe(
+            0.0, SCHEDULER_PRIOR_WORK, SCHEDULER_ENCODE_RATE * SCHEDULER_PRIOR_WORK
+        )
+
+    def features(self, job, renditions=1):
+        cuts = plan_cuts(job["clips"])
+        media = sum(cut_duration(group) for group in cuts)
+        if self.stream_clips:
+            encodes = renditions
+        elif len(cuts) == 1 and renditions == 1:
+            encodes = 1
+        else:
+            encodes = 1 + renditions
+        return len(cuts), media * encodes * self.bitrate_factor
+
+    def estimate(self, item):
+        cuts, work = item["features"]
+        return cuts * self.overhead + work * self.rate
+
+    def observe(self, cuts, work, elapsed):
+        sums = self.sums
+        sums["cc"] += cuts * cuts
+        sums["cw"] += cuts * work
+        sums["ww"] += work * work
+        sums["ct"] += cuts * elapsed
+        sums["wt"] += work * elapsed
+
+    def fit(self):
+        sums = self.sums
+        det = sums["cc"] * sums["ww"] - sums["cw"] ** 2
+        if det <= 0:
+            return
+        overhead = (sums["ct"] * sums["ww"] - sums["wt"] * sums["cw"]) / det
+        rate = (sums["wt"] * sums["cc"] - sums["ct"] * sums["cw"]) / det
+        # Les deux couts restent positifs.
+        if overhead < 0:
+            overhead, rate = 0.0, sums["wt"] / sums["ww"]
+        elif rate < 0:
+            overhead, rate = sums["ct"] / sums["cc"], 0.0
+        self.overhead, self.rate = overhead, rate
+
+    def add(self, item):
+        item["features"] = self.features(item["job"], len(item["outputs"]))
+        with self.lock:
+            self.pending.append(item)
+
+    def __len__(self):
+        with self.lock:
+            return len(self.pending)
+
+    def pop(self):
+        with self.lock:
+            item = max(self.pending, key=self.estimate)
+            self.pending.remove(item)
+            item["estimate"] = self.estimate(item)
+        return item
+
+    def record(self, item, elapsed):
+        with self.lock:
+            self.observe(*item["features"], elapsed)
+            self.fit()
+            remaining = sum(self.estimate(i) for i in self.pending)
+        safe_print(
+            f"{item['job']['set_name']}: {elapsed:.0f}s "
+            f"(estime {item['estimate']:.0f}s), "
+            f"reste environ {remaining / self.workers / 60:.1f} min",
+            log_queue=self.log_queue,
+        )
+
+
+_PIPELINE_STOP = object()
+
+
+class PipelineStage:
+    def __init__(self, name, handler, workers=1, log_queue=None):
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.log_queue = log_queue
+        self.inbox = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        self.downstream = []
+        self.producers = 0
+        self.running = workers
+        self.lock = threading.Lock()
+        self.threads = []
+
+    def connect(self, stage):
+        self.downstream.append(stage)
+        stage.producers += 1
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(
+                target=self.run, name=f"{self.name}-{i}", daemon=True
+            )
+            thread.start()
+            self.threads.append(thread)
+
+    def put(self, item):
+        self.inbox.put(item)
+
+    def close(self):
+        # Appele par chaque producteur qui a fini: le dernier arrete les
+        # workers de l'etage.
+        with self.lock:
+            self.producers -= 1
+            last = self.producers <= 0
+        if last:
+            for _ in range(self.workers):
+                self.inbox.put(_PIPELINE_STOP)
+
+    def run(self):
+        while True:
+            item = self.inbox.get()
+            if item is _PIPELINE_STOP:
+                break
+            try:
+                self.handler(item)
+            except Exception as e:
+                safe_print(
+                    f"[ERREUR] Etape {self.name} pour {item['job']['set_name']}: {e}",
+                    log_queue=self.log_queue,
+                )
+        with self.lock:
+            self.running -= 1
+            last = self.running == 0
+        if last:
+            for stage in self.downstream:
+                stage.close()
+
+    def join(self):
+        for thread in self.threads:
+            thread.join()
+
+
+def process_video(
+    input_video_path,
+    csv_path,
+    background_path,
+    output_dir="sets_output",
+    sprites_dir="thumbnail/sprites",
+    reset_thumbnails=False,
+    center_logo="thumbnail/assets/LogoBC/LogoBC16.png",
+    log_queue=None,
+    stream_clips=False,
+    scratch_dir=None,
+    thumbnail_profile="png",
+    thumbnail_max_bytes=None,
+    layout_path=THUMBNAIL_LAYOUT,
+    pipeline_workers=None,
+    renditions=None,
+    gameplay_offset=None,
+):
+    os.makedirs(output_dir, exist_ok=True)
+    renditions = resolve_renditions(renditions)
+    thumbnail_dir = os.path.join(output_dir, "thumbnails")
+    temp_dir = scratch_dir or os.path.join(output_dir, "temp")
+    os.makedirs(thumbnail_dir, exist_ok=True)
+    scratch = None if stream_clips else ScratchManager(temp_dir)
+    df = pd.read_csv(csv_path, encoding="utf-8")
+    video_info = get_video_info(input_video_path, log_queue=log_queue)
+    if not video_info:
+        safe_print(
+            "Impossible d'obtenir les informations de la video", log_queue=log_queue
+        )
+        return
+    safe_print(f"Video chargee: {input_video_path}", log_queue=log_queue)
+    safe_print(f"FPS: {video_info['fps']}", log_queue=log_queue)
+    safe_print(f"Audio: {video_info['has_audio']}", log_queue=log_queue)
+    safe_print(f"Duree: {video_info['duration']:.2f}s", log_queue=log_queue)
+    settings = {
+        "background_path": background_path,
+        "sprites_dir": sprites_dir,
+        "reset_thumbnails": reset_thumbnails,
+        "center_logo": center_logo,
+        "thumbnail_profile": thumbnail_profile,
+        "thumbnail_max_bytes": thumbnail_max_bytes,
+        "layout_path": layout_path,
+        "source_video": input_video_path,
+        "gameplay_offset": gameplay_offset,
+    }
+    workers = dict(PIPELINE_WORKERS, **(pipeline_workers or {}))
+    manifest = DedupManifest(output_dir)
+
+    # ----- Etages -----
+
+    def thumbnail_stage(item):
+        run_thumbnail_jobs(
+            [item["job"]], thumbnail_dir, manifest, settings, log_queue=log_queue
+        )
+
+    def item_renditions(item):
+        return [output["profile"] for output in item["outputs"]]
+
+    def extract_stage(item):
+        job = item["job"]
+        set_name = job["set_name"]
+        item["started"] = time.monotonic()
+        if stream_clips:
+            safe_print(
+                "Extraction et concatenation en un seul ffmpeg vers: "
+                + ", ".join(output["path"] for output in item["outputs"]),
+                log_queue=log_queue,
+            )
+            item["ok"] = stream_clips_ffmpeg(
+                input_video_path,
+                job["clips"],
+                job["video_path"],
+                log_queue=log_queue,
+                has_audio=video_info["has_audio"],
+                renditions=item_renditions(item),
+            )
+            finalise.put(item)
+            return
+        item["needed_bytes"] = scratch.estimate_bytes(
+            job["clips"], video_info["bit_rate"]
+        )
+        safe_print(
+            f"Espace temporaire estime pour {set_name}: "
+            f"{item['needed_bytes'] / 1e9:.2f} Go",
+            log_queue=log_queue,
+        )
+        try:
+            item["job_dir"] = scratch.acquire(set_name, item["needed_bytes"], log_queue)
+        except OSError as e:
+            safe_print(f"[ERREUR] {set_name}: {e}", log_queue=log_queue)
+            item["ok"] = False
+            finalise.put(item)
+            return
+        try:
+            item["temp_files"] = extract_clips_ffmpeg(
+                input_video_path,
+                job["clips"],
+                item["job_dir"],
+                log_queue=log_queue,
+                set_name=set_name,
+                has_audio=video_info["has_audio"],
+            )
+        except Exception:
+            scratch.release(item["job_dir"], item["needed_bytes"])
+            raise
+        if not item["temp_files"]:
+            safe_print(
+                f"Aucun clip extrait pour le set: {set_name}", log_queue=log_queue
+            )
+            scratch.release(item["job_dir"], item["needed_bytes"])
+            item["ok"] = False
+            finalise.put(item)
+            return
+        concat.put(item)
+
+    def concat_stage(item):
+        # Le dossier du job et ses clips sont supprimes des la fin de la
+        # concatenation.
+        safe_print(
+            "Concatenation vers: "
+            + ", ".join(output["path"] for output in item["outputs"]),
+            log_queue=log_queue,
+        )
+        try:
+            item["ok"] = concatenate_clips_ffmpeg(
+                item["temp_files"],
+                item["job"]["video_path"],
+                log_queue=log_queue,
+                duration=sum(end - start for start, end in item["job"]["clips"]),
+                renditions=item_renditions(item),
+                has_audio=video_info["has_audio"],
+            )
+        finally:
+            scratch.release(item["job_dir"], item["needed_bytes"])
+        finalise.put(item)
+
+    def finalise_stage(item):
+        job = item["job"]
+        if not item["ok"]:
+            safe_print(
+                f"[ERREUR] Erreur lors de l'export: {job['set_name']}",
+                log_queue=log_queue,
+            )
+            return
+        for output in item["outputs"]:
+            manifest.record(output["key"], output["path"])
+        safe_print(f"[OK] Export termine: {job['set_name']}", log_queue=log_queue)
+        scheduler.record(item, time.monotonic() - item["started"])
+        # Sets du meme run aux clips identiques: lien vers la video produite.
+        for key, path in item["followers"]:
+            reuse_output(manifest, key, path, log_queue)
+
+    thumbnails = PipelineStage(
+        "thumbnail", thumbnail_stage, workers["thumbnail"], log_queue
+    )
+    extract = PipelineStage("extract", extract_stage, workers["extract"], log_queue)
+    concat = PipelineStage("concat", concat_stage, workers["concat"], log_queue)
+    finalise = PipelineStage("finalise", finalise_stage, workers["finalise"], log_queue)
+    extract.connect(concat)
+    extract.connect(finalise)
+    concat.connect(finalise)
+    # Le plan (ce thread) est le producteur de thumbnail et extract.
+    thumbnails.producers = extract.producers = 1
+    stages = [thumbnails, extract, concat, finalise]
+    for stage in stages:
+        stage.start()
+
+    # ----- Plan -----
+
+    scheduler = SetScheduler(
+        video_info["bit_rate"], workers["extract"], stream_clips, log_queue
+    )
+    thumbnail_items = []
+    scheduled = {}
+    feeder = None
+    try:
+        for job in plan_sets(
+            df, output_dir, log_queue=log_queue, sprites_dir=sprites_dir
+        ):
+            set_name = job["set_name"]
+            safe_print(f"Set planifie: {set_name}", log_queue=log_queue)
+            if job["players"]:
+                thumbnail_items.append({"job": job})
+            if not job["clips"]:
+                safe_print(
+                    f"Aucun clip valide trouve pour le set: {set_name}",
+                    log_queue=log_queue,
+                )
+                continue
+            for i, (start_sec, end_sec) in enumerate(job["clips"], 1):
+                safe_print(
+                    f"{set_name}: clip {i} ajoute: {start_sec}s - {end_sec}s",
+                    log_queue=log_queue,
+                )
+            # Seuls les rendus manquants sont encodes, ensemble.
+            outputs = []
+            for profile in renditions:
+                path = rendition_path(job["video_path"], profile)
+                key = video_job_key(job, input_video_path, stream_clips, profile)
+                if manifest.is_current(key, path):
+                    safe_print(f"[OK] Video deja a jour: {path}", log_queue=log_queue)
+                elif key in scheduled:
+                    scheduled[key]["followers"].append((key, path))
+                elif not reuse_output(manifest, key, path, log_queue):
+                    outputs.append({"key": key, "path": path, "profile": profile})
+            if not outputs:
+                continue
+            item = {"job": job, "outputs": outputs, "followers": []}
+            for output in outputs:
+                scheduled[output["key"]] = item
+            scheduler.add(item)
+
+        def feed_thumbnails():
+            try:
+                for item in thumbnail_items:
+                    thumbnails.put(item)
+            finally:
+                thumbnails.close()
+
+        feeder = threading.Thread(target=feed_thumbnails, daemon=True)
+        feeder.start()
+        # La file bornee ne prend le set suivant que quand un worker se
+        # libere: les derniers choix utilisent les couts ajustes sur les sets
+        # deja termines.
+        while len(scheduler):
+            extract.put(scheduler.pop())
+    finally:
+        if feeder is None:
+            thumbnails.close()
+        extract.close()
+        for stage in stages:
+            stage.join()
+    if not scratch_dir:
+        try:
+            os.rmdir(temp_dir)
+        except:
+            pass
+    safe_print(f"\n[OK] Traitement termine!", log_queue=log_queue)
+
+
+# ----- Chapitres -----
+#
+# Mode archive: la VOD complete est remuxee sans reencodage (-c copy) avec un
+# chapitre par set. Un chapitre couvre le set du debut de son premier clip a
+# la fin de son dernier; les lignes du CSV sont lues comme pour l'export. Une
+# description au format YouTube (un horodatage par ligne) est ecrite a cote.
+
+CHAPTERS_INTRO_TITLE = "Debut"
+YOUTUBE_MIN_CHAPTER = 10.0
+
+
+def chapter_title(job):
+    players = job["players"] or {}
+    names = [
+        str(players[field]).strip()
+        for field in ["player1_name", "player2_name"]
+        if not pd.isna(players.get(field))
+    ]
+    if len(names) == 2:
+        return f"{job['set_name']} - {names[0]} vs {names[1]}"
+    return str(job["set_name"])
+
+
+def plan_chapters(jobs, duration=None, log_queue=None):
+    chapters = []
+    for job in jobs:
+        if not job["clips"]:
+            safe_print(
+                f"Aucun clip valide trouve pour le set: {job['set_name']}",
+                log_queue=log_queue,
+            )
+            continue
+        start = min(start for start, _ in job["clips"])
+        end = max(end for _, end in job["clips"])
+        if duration:
+            end = min(end, duration)
+        chapters.append({"title": chapter_title(job), "start": start, "end": end})
+    chapters.sort(key=lambda chapter: chapter["start"])
+    # Deux sets qui se chevauchent: le premier s'arrete ou le suivant commence.
+    for chapter, following in zip(chapters, chapters[1:]):
+        chapter["end"] = min(chapter["end"], following["start"])
+    chapters = [chapter for chapter in chapters if chapter["end"] > chapter["start"]]
+    # YouTube exige un premier chapitre a 0:00: un debut trop court pour
+    # etre un chapitre est rattache au premier set.
+    if chapters and chapters[0]["start"] < YOUTUBE_MIN_CHAPTER:
+        chapters[0]["start"] = 0.0
+    elif chapters:
+        chapters.insert(
+            0,
+            {"title": CHAPTERS_INTRO_TITLE, "start": 0.0, "end": chapters[0]["start"]},
+        )
+    return chapters
+
+
+def escape_ffmetadata(value):
+    return re.sub(r"([=;#\\\n])", r"\\\1", str(value))
+
+
+def write_ffmetadata(chapters, path):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(";FFMETADATA1\n")
+        for chapter in chapters:
+            f.write("[CHAPTER]\nTIMEBASE=1/1000\n")
+            f.write(f"START={round(chapter['start'] * 1000)}\n")
+            f.write(f"END={round(chapter['end'] * 1000)}\n")
+            f.write(f"title={escape_ffmetadata(chapter['title'])}\n")
+
+
+def format_youtube_timestamp(seconds, with_hours=False):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if with_hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+def write_youtube_description(chapters, path, log_queue=None):
+    with_hours = any(chapter["start"] >= 3600 for chapter in chapters)
+    with open(path, "w", encoding="utf-8") as f:
+        for chapter in chapters:
+            timestamp = format_youtube_timestamp(chapter["start"], with_hours)
+            f.write(f"{timestamp} {chapter['title']}\n")
+    short = [
+        c["title"] for c in chapters if c["end"] - c["start"] < YOUTUBE_MIN_CHAPTER
+    ]
+    if short:
+        safe_print(
+            f"[ATTENTION] Chapitres de moins de {YOUTUBE_MIN_CHAPTER:.0f}s, "
+            f"ignores par YouTube: {', '.join(short)}",
+            log_queue=log_queue,
+        )
+    if len(chapters) < 3:
+        safe_print(
+            "[ATTENTION] YouTube n'affiche les chapitres qu'a partir de 3",
+            log_queue=log_queue,
+        )
+
+
+def generate_chapters_only(
+    input_video_path, csv_path, output_dir="sets_output", log_queue=None
+):
+    os.makedirs(output_dir, exist_ok=True)
+    df = pd.read_csv(csv_path, encoding="utf-8")
+    safe_print("Mode chapitres (remux sans reencodage)", log_queue=log_queue)
+    video_info = get_video_info(input_video_path, log_queue=log_queue)
+    duration = video_info["duration"] if video_info else None
+    chapters = plan_chapters(
+        plan_sets(df, output_dir, log_queue=log_queue), duration, log_queue
+    )
+    if not chapters:
+        safe_print("Aucun chapitre a ecrire", log_queue=log_queue)
+        return False
+    root, ext = os.path.splitext(os.path.basename(input_video_path))
+    output_path = os.path.join(output_dir, f"{root}_chapitres{ext}")
+    metadata_path = os.path.join(output_dir, f"{root}_chapitres.ffmetadata")
+    description_path = os.path.join(output_dir, f"{root}_youtube.txt")
+    write_ffmetadata(chapters, metadata_path)
+    for chapter in chapters:
+        safe_print(
+            f"Chapitre {format_youtube_timestamp(chapter['start'], True)}: "
+            f"{chapter['title']}",
+            log_queue=log_queue,
+        )
+    # Les flux de donnees (timecode...) sont ecartes: le muxer mp4 les refuse
+    # souvent. Les metadonnees globales de la source sont conservees.
+    args = (
+        ["ffmpeg"]
+        + FFMPEG_GLOBAL_ARGS
+        + ["-i", input_video_path, "-i", metadata_path]
+        + ["-map", "0", "-dn", "-map_metadata", "0", "-map_chapters", "1"]
+        + ["-c", "copy", output_path, "-y"]
+    )
+    try:
+        get_ffmpeg_runner().run(
+            args,
+            label=f"Remux {os.path.basename(output_path)}",
+            duration=duration,
+            log_queue=log_queue,
+        )
+    except Exception as e:
+        safe_print(
+            f"Erreur lors du remux: {ffmpeg_error_message(e)}", log_queue=log_queue
+        )
+        return False
+    finally:
+        os.remove(metadata_path)
+    write_youtube_description(chapters, description_path, log_queue)
+    safe_print(f"[OK] Video chapitree: {output_path}", log_queue=log_queue)
+    safe_print(f"[OK] Description YouTube: {description_path}", log_queue=log_queue)
+    return True
+
+
+# ----- Analyse de la VOD -----
+#
+# Propose les bornes des sets sans parcourir la VOD a la main. Seules les
+# images cles sont decodees (-skip_frame nokey) par le runner ffmpeg,
+# reduites a SCAN_SIZE en niveaux de gris (2,3 Ko par image, une vingtaine de
+# Mo pour une longue VOD) et classees par lots de SCAN_BATCH_FRAMES vues
+# sans copie par NumPy. Le filtre showinfo donne l'horodatage de chaque image
+# sur stderr. Chaque image est classee: noir (transition), ecran de reference
+# du jeu (selection des personnages, resultats; images du dossier
+# SCAN_REFERENCES_DIR nommees select*.png / results*.png) ou jeu. Une partie
+# commence a la selection des personnages et finit apres les resultats; les
+# parties proches forment un set. Le resultat est un CSV brouillon au format
+# habituel, a relire avant l'export.
+
+SCAN_SIZE = (64, 36)
+SCAN_BATCH_FRAMES = 256
+SCAN_BLACK_LEVEL = 20
+SCAN_MATCH_THRESHOLD = 18.0
+SCAN_REFERENCES_DIR = "scan/references"
+SCAN_REFERENCE_KINDS = ["select", "results"]
+SCAN_MIN_GAME = 30.0
+SCAN_MAX_GAP = 10.0
+SCAN_SET_GAP = 90.0
+SCAN_MAX_CLIPS = 5
+SCAN_PTS_PATTERN = re.compile(r"pts_time:\s*(-?[\d.]+)")
+
+
+def load_scan_references(references_dir, log_queue=None):
+    references = {}
+    for kind in SCAN_REFERENCE_KINDS:
+        images = []
+        for path in sorted(glob.glob(os.path.join(references_dir, f"{kind}*.png"))):
+            with Image.open(path) as image:
+                image = image.convert("L").resize(SCAN_SIZE, Image.BILINEAR)
+                images.append(np.asarray(image, dtype=np.int16))
+        if images:
+            references[kind] = np.stack(images)
+        safe_print(f"Ecrans de reference {kind}: {len(images)}", log_queue=log_queue)
+    return references
+
+
+def classify_frames(frames, references):
+    # frames: (n, h, w) uint8. Distance moyenne au plus proche ecran de
+    # reference de chaque type.
+    labels = np.full(len(frames), "game", dtype=object)
+    for kind, images in references.items():
+        distance = (
+            np.abs(frames[:, None].astype(np.int16) - images[None])
+            .mean(axis=(2, 3))
+            .min(axis=1)
+        )
+        labels[distance < SCAN_MATCH_THRESHOLD] = kind
+    labels[frames.mean(axis=(1, 2)) < SCAN_BLACK_LEVEL] = "black"
+    return labels
+
+
+def scan_keyframes(input_video_path, references, log_queue=None):
+    width, height = SCAN_SIZE
+    frame_size = width * height
+    args = ffmpeg.compile(
+        ffmpeg.input(input_video_path, skip_frame="nokey")
+        .filter("scale", width, height)
+        .filter("format", "gray")
+        .filter("showinfo")
+        .output("pipe:1", format="rawvideo", pix_fmt="gray", fps_mode="passthrough"),
+    )
+    args = args[:1] + ["-hide_banner", "-nostats", "-an", "-sn", "-dn"] + args[1:]
+    timestamps = []
+
+    def read_timestamp(line):
+        match = SCAN_PTS_PATTERN.search(line)
+        if match:
+            timestamps.append(float(match.group(1)))
+        return match is not None or "Parsed_showinfo" in line
+
+    data = get_ffmpeg_runner().run(
+        args,
+        label="Analyse",
+        capture_stdout=True,
+        log_queue=log_queue,
+        stderr_handler=read_timestamp,
+    )
+    # np.frombuffer lit chaque lot sans copie.
+    count = min(len(timestamps), len(data) // frame_size)
+    labels = []
+    for start in range(0, count, SCAN_BATCH_FRAMES):
+        frames = min(SCAN_BATCH_FRAMES, count - start)
+        batch = np.frombuffer(
+            data, dtype=np.uint8, count=frames * frame_size, offset=start * frame_size
+        )
+        labels.extend(classify_frames(batch.reshape(frames, height, width), references))
+    return timestamps[:count], labels
+
+
+def find_games(timestamps, labels):
+    if len(timestamps) < 2:
+        return []
+    step = float(np.median(np.diff(timestamps)))
+    games = []
+    current = None
+
+    def close():
+        if current and current["end"] - current["start"] >= SCAN_MIN_GAME:
+            games.append((current["start"], current["end"]))
+
+    for time_sec, label in zip(timestamps, labels):
+        if current and (
+            label == "black"
+            or time_sec - current["end"] > SCAN_MAX_GAP
+            or (label == "select" and current["results"])
+        ):
+            close()
+            current = None
+        if label == "black":
+            continue
+        if current is None:
+            current = {"start": time_sec, "end": time_sec, "results": False}
+        # La partie dure au moins jusqu'a l'image cle suivante.
+        current["end"] = time_sec + step
+        current["results"] = current["results"] or label == "results"
+    close()
+    return games
+
+
+def group_games(games):
+    sets = []
+    for game in games:
+        if sets and game[0] - sets[-1][-1][1] <= SCAN_SET_GAP:
+            sets[-1].append(game)
+        else:
+            sets.append([game])
+    # Le CSV a SCAN_MAX_CLIPS plages par set: les parties les plus proches
+    # sont fusionnees.
+    for clips in sets:
+        while len(clips) > SCAN_MAX_CLIPS:
+            i = min(range(len(clips) - 1), key=lambda i: clips[i + 1][0] - clips[i][1])
+            clips[i : i + 2] = [(clips[i][0], clips[i + 1][1])]
+    return sets
+
+
+def format_timecode(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+
+def write_draft_csv(sets, path):
+    rows = []
+    for number, clips in enumerate(sets, 1):
+        row = {"set_name": f"Set {number}"}
+        for i in range(1, SCAN_MAX_CLIPS + 1):
+            start, end = clips[i - 1] if i <= len(clips) else ("", "")
+            row[f"start{i}"] = format_timecode(start) if start != "" else ""
+            row[f"end{i}"] = format_timecode(math.ceil(end)) if end != "" else ""
+        row.update({field: "" for field in PLAYER_FIELDS})
+        rows.append(row)
+    columns = ["set_name"]
+    for i in range(1, SCAN_MAX_CLIPS + 1):
+        columns += [f"start{i}", f"end{i}"]
+    pd.DataFrame(rows, columns=columns + PLAYER_FIELDS).to_csv(
+        path, index=False, encoding="utf-8"
+    )
+
+
+def analyse_vod(
+    input_video_path,
+    output_dir="sets_output",
+    references_dir=SCAN_REFERENCES_DIR,
+    log_queue=None,
+):
+    if np is None:
+        safe_print(
+            "NumPy n'est pas installe, l'analyse de la VOD est indisponible",
+            log_queue=log_queue,
+        )
+        return None
+    os.makedirs(output_dir, exist_ok=True)
+    safe_print(f"Analyse des images cles de: {input_video_path}", log_queue=log_queue)
+    references = load_scan_references(references_dir, log_queue)
+    if not references:
+        safe_print(
+            "Aucun ecran de reference: seules les transitions noires sont utilisees",
+            log_queue=log_queue,
+        )
+    started = time.monotonic()
+    try:
+        timestamps, labels = scan_keyframes(input_video_path, references, log_queue)
+    except Exception as e:
+        safe_print(
+            f"Erreur lors de l'analyse: {ffmpeg_error_message(e)}", log_queue=log_queue
+        )
+        return None
+    elapsed = time.monotonic() - started
+    if timestamps:
+        safe_print(
+            f"{len(timestamps)} images cles analysees en {elapsed:.1f}s "
+            f"({timestamps[-1] / max(elapsed, 1e-3):.0f}x le temps reel)",
+            log_queue=log_queue,
+        )
+    if len(timestamps) > 1 and np.median(np.diff(timestamps)) > SCAN_MAX_GAP:
+        safe_print(
+            "[ATTENTION] Images cles trop espacees pour une detection fiable",
+            log_queue=log_queue,
+        )
+    sets = group_games(find_games(timestamps, labels))
+    for number, clips in enumerate(sets, 1):
+        ranges = ", ".join(
+            f"{format_timecode(start)}-{format_timecode(math.ceil(end))}"
+            for start, end in clips
+        )
+        safe_print(f"Set {number}: {ranges}", log_queue=log_queue)
+    root = os.path.splitext(os.path.basename(input_video_path))[0]
+    csv_path = os.path.join(output_dir, f"{root}_brouillon.csv")
+    write_draft_csv(sets, csv_path)
+    safe_print(
+        f"[OK] CSV brouillon ({len(sets)} sets) a relire: {csv_path}",
+        log_queue=log_queue,
+    )
+    return csv_path
+
+
+# ----- Planches de verification -----
+#
+# Pour relire les coupes sans regarder chaque video: pour chaque clip, une
+# image juste avant et juste apres son debut et sa fin (SHEET_OFFSET). Les
+# images de tout l'evenement sont extraites par lots de SHEET_BATCH_FRAMES,
+# un seul ffmpeg par lot: une entree par image avec -ss avant -i (saut a
+# l'image cle precedente puis decodage jusqu'a l'instant voulu), une image
+# par entree, mises bout a bout en rgb24 sur stdout. Chaque entree garde son
+# decodeur ouvert jusqu'a la fin du lot (~30 Mo en 1080p, meme limite a un
+# thread): les lots restent petits. Si une entree ne donne pas d'image, le
+# lot ne se decoupe plus: ses images sont alors relues une par une, pour
+# que seule la vignette fautive reste vide. Une planche par set, une ligne
+# par clip.
+
+SHEET_OFFSET = 1.0
+SHEET_TILE_SIZE = (320, 180)
+SHEET_BATCH_FRAMES = 8
+SHEET_FONT = "thumbnail/font/Inter.ttf"
+SHEET_FONT_SIZE = 16
+SHEET_HEADER_HEIGHT = 40
+SHEET_LABEL_HEIGHT = 24
+SHEET_MARGIN = 8
+SHEET_BACKGROUND = (24, 24, 24)
+SHEET_MISSING = (70, 70, 70)
+SHEET_PROFILE = "jpeg"
+SHEET_COLUMNS = [
+    ("avant debut", 0, -1),
+    ("debut", 0, 1),
+    ("fin", 1, -1),
+    ("apres fin", 1, 1),
+]
+
+
+def sheet_frame_times(clips, duration=None):
+    times = []
+    for clip in clips:
+        for _, edge, direction in SHEET_COLUMNS:
+            time_sec = max(0.0, clip[edge] + direction * SHEET_OFFSET)
+            if duration:
+                # Une entree sans image decalerait toutes les suivantes.
+                time_sec = min(time_sec, max(0.0, duration - SHEET_OFFSET))
+            times.append(time_sec)
+    return times
+
+
+def extract_frames_args(input_video_path, times):
+    width, height = SHEET_TILE_SIZE
+    streams = [
+        ffmpeg.input(input_video_path, ss=time_sec, threads=1)
+        .video.filter("trim", end_frame=1)
+        .filter("scale", width, height, force_original_aspect_ratio="decrease")
+        .filter("pad", width, height, "(ow-iw)/2", "(oh-ih)/2")
+        .filter("setsar", 1)
+        for time_sec in times
+    ]
+    if len(streams) > 1:
+        stream = ffmpeg.concat(*streams, v=1, a=0)
+    else:
+        stream = streams[0]
+    return ffmpeg_args(
+        stream.output(
+            "pipe:1", format="rawvideo", pix_fmt="rgb24", fps_mode="passthrough"
+        )
+    )
+
+
+def split_frames(data, count):
+    frame_size = SHEET_TILE_SIZE[0] * SHEET_TILE_SIZE[1] * 3
+    if len(data) != frame_size * count:
+        return None
+    return [
+        Image.frombuffer(
+            "RGB", SHEET_TILE_SIZE, data[i * frame_size : (i + 1) * frame_size]
+        )
+        for i in range(count)
+    ]
+
+
+def extract_frames(input_video_path, times, log_queue=None):
+    # Chaque instant n'est extrait qu'une fois (fin d'un clip et debut du
+    # suivant), dans l'ordre de la video.
+    runner = get_ffmpeg_runner()
+    unique_times = sorted(set(times))
+    batches = [
+        unique_times[i : i + SHEET_BATCH_FRAMES]
+        for i in range(0, len(unique_times), SHEET_BATCH_FRAMES)
+    ]
+    futures = [
+        runner.submit(
+            extract_frames_args(input_video_path, batch),
+            label=f"Images {i + 1}/{len(batches)}",
+            capture_stdout=True,
+            log_queue=log_queue,
+        )
+        for i, batch in enumerate(batches)
+    ]
+    frames = {}
+    retry = []
+    for batch, future in zip(batches, futures):
+        images = None
+        try:
+            images = split_frames(future.result(), len(batch))
+        except Exception as e:
+            safe_print(
+                f"Erreur lors de l'extraction des images: {ffmpeg_error_message(e)}",
+                log_queue=log_queue,
+            )
+        if images is None:
+            retry.extend(batch)
+        else:
+            frames.update(zip(batch, images))
+    if retry:
+        safe_print(
+            f"[ATTENTION] {len(retry)} images relues une par une", log_queue=log_queue
+        )
+        futures = [
+            runner.submit(
+                extract_frames_args(input_video_path, [time_sec]),
+                capture_stdout=True,
+                log_queue=log_queue,
+            )
+            for time_sec in retry
+        ]
+        for time_sec, future in zip(retry, futures):
+            try:
+                frames[time_sec] = (split_frames(future.result(), 1) or [None])[0]
+            except Exception:
+                frames[time_sec] = None
+            if frames[time_sec] is None:
+                safe_print(
+                    f"[ATTENTION] Pas d'image a {format_timecode(time_sec)}",
+                    log_queue=log_queue,
+                )
+    return [frames[time_sec] for time_sec in times]
+
+
+def build_contact_sheet(job, times, frames):
+    tile_width, tile_height = SHEET_TILE_SIZE
+    cell_height = SHEET_LABEL_HEIGHT + tile_height + SHEET_MARGIN
+    width = SHEET_MARGIN + len(SHEET_COLUMNS) * (tile_width + SHEET_MARGIN)
+    height = SHEET_HEADER_HEIGHT + len(job["clips"]) * cell_height
+    sheet = Image.new("RGB", (width, height), SHEET_BACKGROUND)
+    draw = ImageDraw.Draw(sheet)
+    font = get_font(SHEET_FONT, SHEET_FONT_SIZE)
+    header_font = get_font(SHEET_FONT, SHEET_FONT_SIZE + 4)
+    draw.text(
+        (SHEET_MARGIN, SHEET_MARGIN),
+        f"{job['set_name']} - {len(job['clips'])} clip(s)",
+        font=header_font,
+        fill="white",
+    )
+    for i, (time_sec, frame) in enumerate(zip(times, frames)):
+        row, column = divmod(i, len(SHEET_COLUMNS))
+        x = SHEET_MARGIN + column * (tile_width + SHEET_MARGIN)
+        y = SHEET_HEADER_HEIGHT + row * cell_height
+        label = SHEET_COLUMNS[column][0]
+        draw.text(
+            (x, y + 2),
+            f"Clip {row + 1} {label} {format_timecode(time_sec)}"
+            f".{int(time_sec * 10) % 10}",
+            font=font,
+            fill="white",
+        )
+        box = (x, y + SHEET_LABEL_HEIGHT)
+        if frame is None:
+            sheet.paste(SHEET_MISSING, box + (x + tile_width, box[1] + tile_height))
+        else:
+            sheet.paste(frame, box)
+    return sheet
+
+
+def generate_verification_sheets(
+    input_video_path, csv_path, output_dir="sets_output", log_queue=None
+):
+    sheet_dir = os.path.join(output_dir, "verification")
+    os.makedirs(sheet_dir, exist_ok=True)
+    df = pd.read_csv(csv_path, encoding="utf-8")
+    safe_print("Mode planches de verification", log_queue=log_queue)
+    video_info = get_video_info(input_video_path, log_queue=log_queue)
+    duration = video_info["duration"] if video_info else None
+    jobs = [
+        job for job in plan_sets(df, output_dir, log_queue=log_queue) if job["clips"]
+    ]
+    job_times = [sheet_frame_times(job["clips"], duration) for job in jobs]
+    all_times = [time_sec for times in job_times for time_sec in times]
+    started = time.monotonic()
+    frames = extract_frames(input_video_path, all_times, log_queue)
+    safe_print(
+        f"{len(all_times)} images extraites en {time.monotonic() - started:.1f}s",
+        log_queue=log_queue,
+    )
+    paths = []
+    index = 0
+    for job, times in zip(jobs, job_times):
+        sheet = build_contact_sheet(job, times, frames[index : index + len(times)])
+        index += len(times)
+        path = os.path.join(
+            sheet_dir,
+            f"{job['output_name']}_verification"
+            + THUMBNAIL_PROFILES[SHEET_PROFILE]["ext"],
+        )
+        save_thumbnail(sheet, path, SHEET_PROFILE, log_queue=log_queue)
+        safe_print(f"[OK] Planche: {path}", log_queue=log_queue)
+        paths.append(path)
+    return paths
+
+
+# ----- Edition du CSV -----
+#
+# Le CSV est garde ligne a ligne avec son texte d'origine: a l'enregistrement
+# seules les lignes modifiees (ou ajoutees) sont reecrites, les autres sont
+# recopiees a l'octet pres. Les cellules sont validees a la saisie: timecodes
+# lisibles par timecode_to_seconds et fin apres debut, skins resolus par
+# l'index des sprites.
+
+TIMECODE_COLUMN = re.compile(r"^(start|end)(\d*)$")
+
+
+def validate_csv_cell(columns, row, column, sprite_index):
+    # Retourne un message d'erreur, ou None si la cellule est valide.
+    name = columns[column]
+    value = row[column].strip() if column < len(row) else ""
+    match = TIMECODE_COLUMN.match(name)
+    if match:
+        if not value:
+            return None
+        try:
+            seconds = parse_timecode(value)
+        except ValueError:
+            return f"Timecode invalide: {value}"
+        if match.group(1) == "end":
+            start_name = f"start{match.group(2)}"
+            start_column = columns.index(start_name) if start_name in columns else None
+            if start_column is not None and start_column < len(row):
+                try:
+                    start = parse_timecode(row[start_column].strip())
+                except ValueError:
+                    return None
+                if seconds <= start:
+                    return "La fin doit etre apres le debut"
+        return None
+    if name in SKIN_COLUMNS and value:
+        if sprite_index is None or sprite_index.resolve(value) is None:
+            return unknown_sprite_message(sprite_index, value)
+    return None
+
+
+class CsvDocument:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            lines = f.readlines()
+        self.newline = "\r\n" if lines and lines[0].endswith("\r\n") else "\n"
+        # Texte d'origine de chaque enregistrement (un champ entre
+        # guillemets peut couvrir plusieurs lignes).
+        reader = csv.reader(iter(lines))
+        records = []
+        consumed = 0
+        for values in reader:
+            records.append(("".join(lines[consumed : reader.line_num]), values))
+            consumed = reader.line_num
+        if not records:
+            raise ValueError("CSV vide")
+        self.header_text, self.header = records[0]
+        # Noms de colonnes sans BOM ni espaces, pour la validation.
+        self.columns = [name.lstrip("\ufeff").strip() for name in self.header]
+        self.texts = [text for text, _ in records[1:]]
+        self.rows = [values for _, values in records[1:]]
+        self.changed = set()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def get(self, index, column):
+        row = self.rows[index]
+        return row[column] if column < len(row) else ""
+
+    def set(self, index, column, value):
+        row = self.rows[index]
+        if column >= len(row):
+            if not value:
+                return
+            row.extend([""] * (column + 1 - len(row)))
+        if row[column] != value:
+            row[column] = value
+            self.changed.add(index)
+
+    def append(self):
+        self.rows.append([""] * len(self.header))
+        self.texts.append(None)
+        self.changed.add(len(self.rows) - 1)
+        return len(self.rows) - 1
+
+    def format_row(self, row):
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator=self.newline).writerow(row)
+        return buffer.getvalue()
+
+    def save(self):
+        # Ecriture atomique, comme le manifeste de deduplication. Une ligne
+        # ajoutee et restee vide n'est pas ecrite.
+        saved = 0
+        for index in self.changed:
+            if self.texts[index] is None and not any(
+                value.strip() for value in self.rows[index]
+            ):
+                continue
+            self.texts[index] = self.format_row(self.rows[index])
+            saved += 1
+        texts = [text for text in self.texts if text is not None]
+        if texts and not texts[-1].endswith(("\n", "\r")):
+            # Derniere ligne sans retour a la ligne suivie de lignes ajoutees.
+            texts[-1] += self.newline
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+            f.write(self.header_text)
+            if not self.header_text.endswith(("\n", "\r")) and texts:
+                f.write(self.newline)
+            f.writelines(texts)
+        os.replace(tmp_path, self.path)
+        self.changed.clear()
+        return saved
+
+
+# ----- Dossier surveille -----
+#
+# Mode demon (python main.py --watch DOSSIER): les VOD et CSV deposes dans le
+# dossier sont traites sans ouvrir le GUI. Le dossier est surveille par
+# inotify (appele via ctypes): sans evenement, la boucle dort. Un fichier est
+# pret quand ni sa taille ni sa date n'ont bouge depuis WATCH_SETTLE_SECONDS
+# (copie terminee). Un CSV accompagne d'une VOD du meme nom lance
+# process_video, un CSV seul generate_thumbnails_only, dans
+# <sortie>/<nom>/. Un CSV sans VOD attend WATCH_VIDEO_GRACE_SECONDS qu'une
+# copie de VOD commence, et rien n'est lance tant qu'une VOD du meme nom est
+# en cours de copie: c'est elle qui relance l'evenement une fois prete. Un
+# fichier supprime est oublie (une VOD retiree ne sert plus aux CSV suivants).
+# Grace au manifeste de deduplication, un CSV modifie ne reconstruit que les
+# sets touches. Les jobs passent par des workers
+# permanents: runner ffmpeg, packs de sprites, polices et gabarits restent
+# charges d'un evenement a l'autre. Sans inotify (Windows, macOS) le dossier
+# est relu toutes les WATCH_POLL_SECONDS.
+
+WATCH_SETTLE_SECONDS = 10
+WATCH_VIDEO_GRACE_SECONDS = 60
+WATCH_POLL_SECONDS = 5
+WATCH_WORKERS = 1
+WATCH_VIDEO_EXTENSIONS = (".mp4", ".mkv", ".mov")
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+INOTIFY_MASK = (
+    IN_MODIFY
+    | IN_ATTRIB
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+)
+INOTIFY_EVENT = struct.Struct("iIII")
+INOTIFY_BUFFER = 64 * 1024
+
+
+class Inotify:
+    def __init__(self, path, mask=INOTIFY_MASK):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 a echoue")
+        if libc.inotify_add_watch(self.fd, os.fsencode(path), mask) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, f"Impossible de surveiller {path}")
+
+    def read(self, timeout=None):
+        # Noms des fichiers touches (None si la file du noyau a deborde:
+        # tout le dossier est a relire), [] si rien avant timeout.
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, INOTIFY_BUFFER)
+        except BlockingIOError:
+            return []
+        names = []
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            if mask & IN_Q_OVERFLOW:
+                return None
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            if name:
+                names.append(os.fsdecode(name))
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+def is_watched_file(name):
+    lower = name.lower()
+    return not lower.startswith(".") and (
+        lower.endswith(".csv") or lower.endswith(WATCH_VIDEO_EXTENSIONS)
+    )
+
+
+class WatchFolder:
+    def __init__(
+        self,
+        watch_dir,
+        output_root,
+        options,
+        workers=WATCH_WORKERS,
+        settle_seconds=WATCH_SETTLE_SECONDS,
+        grace_seconds=WATCH_VIDEO_GRACE_SECONDS,
+        log_queue=None,
+    ):
+        self.watch_dir = watch_dir
+        self.output_root = output_root
+        self.options = options
+        self.settle_seconds = settle_seconds
+        self.grace_seconds = grace_seconds
+        self.log_queue = log_queue
+        self.jobs = queue.Queue()
+        self.lock = threading.Lock()
+        self.pending = set()
+        self.event_locks = collections.defaultdict(threading.Lock)
+        # Fichiers en cours de copie: nom -> (derniere activite, signature),
+        # signature des fichiers deja traites et CSV sans VOD: evenement ->
+        # echeance. Lus par les workers, modifies sous self.lock.
+        self.settling = {}
+        self.settled = {}
+        self.waiting = {}
+        self.workers = [
+            threading.Thread(target=self.worker, daemon=True) for _ in range(workers)
+        ]
+
+    def touch(self, name):
+        if is_watched_file(name):
+            signature = file_signature(os.path.join(self.watch_dir, name))
+            with self.lock:
+                self.settling[name] = (time.monotonic(), signature)
+
+    def scan(self):
+        self.prune()
+        for entry in os.scandir(self.watch_dir):
+            signature = file_signature(entry.path) if entry.is_file() else None
+            with self.lock:
+                changed = (
+                    entry.name not in self.settling
+                    and self.settled.get(entry.name) != signature
+                )
+            if signature is not None and changed:
+                self.touch(entry.name)
+
+    def prune(self, event=None):
+        # Oublie les fichiers traites qui ont disparu du dossier.
+        with self.lock:
+            for name in list(self.settled):
+                if event is not None and os.path.splitext(name)[0] != event:
+                    continue
+                if file_signature(os.path.join(self.watch_dir, name)) is None:
+                    del self.settled[name]
+
+    def has_video(self, event):
+        # Appele sous self.lock.
+        return any(
+            os.path.splitext(name)[0] == event
+            and os.path.splitext(name)[1].lower() in WATCH_VIDEO_EXTENSIONS
+            for name in [*self.settled, *self.settling]
+        )
+
+    def settle(self):
+        # Met en file les fichiers stables; retourne le delai avant la
+        # prochaine verification (None: rien en cours de copie).
+        now = time.monotonic()
+        delay = None
+        ready = []
+        deferred = []
+        events = []
+        with self.lock:
+            for name, (since, signature) in list(self.settling.items()):
+                current = file_signature(os.path.join(self.watch_dir, name))
+                if current is None:
+                    # Supprime ou renomme pendant ou apres la copie.
+                    del self.settling[name]
+                    self.settled.pop(name, None)
+                    continue
+                if current != signature:
+                    self.settling[name] = (now, current)
+                    since = now
+                elif now - since >= self.settle_seconds:
+                    del self.settling[name]
+                    if self.settled.get(name) != current:
+                        self.settled[name] = current
+                        ready.append(name)
+                    continue
+                remaining = since + self.settle_seconds - now
+                delay = remaining if delay is None else min(delay, remaining)
+            for name in ready:
+                event, ext = os.path.splitext(name)
+                if ext.lower() == ".csv" and not self.has_video(event):
+                    self.waiting[event] = now + self.grace_seconds
+                    deferred.append(event)
+                else:
+                    self.waiting.pop(event, None)
+                    events.append(event)
+            for event, deadline in list(self.waiting.items()):
+                if deadline <= now:
+                    del self.waiting[event]
+                    events.append(event)
+                else:
+                    remaining = deadline - now
+                    delay = remaining if delay is None else min(delay, remaining)
+        for name in ready:
+            safe_print(f"Fichier pret: {name}", log_queue=self.log_queue)
+        for event in deferred:
+            safe_print(
+                f"{event}: pas de VOD, thumbnails seules dans "
+                f"{self.grace_seconds:.0f}s si aucune VOD n'arrive",
+                log_queue=self.log_queue,
+            )
+        for event in events:
+            self.queue_event(event)
+        return delay
+
+    def queue_event(self, event):
+        with self.lock:
+            if event in self.pending:
+                return
+            self.pending.add(event)
+        self.jobs.put(event)
+
+    def event_files(self, event):
+        # CSV et VOD stables de l'evenement, et VOD encore en copie.
+        csv_path = None
+        video_path = None
+        copying = False
+        self.prune(event)
+        with self.lock:
+            for name in self.settled:
+                stem, ext = os.path.splitext(name)
+                if stem != event or name in self.settling:
+                    continue
+                path = os.path.join(self.watch_dir, name)
+                if ext.lower() == ".csv":
+                    csv_path = path
+                elif ext.lower() in WATCH_VIDEO_EXTENSIONS:
+                    video_path = path
+            for name in self.settling:
+                stem, ext = os.path.splitext(name)
+                if stem == event and ext.lower() in WATCH_VIDEO_EXTENSIONS:
+                    copying = True
+        return csv_path, video_path, copying
+
+    def run_event(self, event):
+        csv_path, video_path, copying = self.event_files(event)
+        if csv_path is None:
+            safe_print(f"{event}: en attente du CSV", log_queue=self.log_queue)
+            return
+        if copying:
+            # La VOD relancera l'evenement une fois copiee.
+            safe_print(
+                f"{event}: VOD en cours de copie, en attente", log_queue=self.log_queue
+            )
+            return
+        output_dir = os.path.join(self.output_root, event)
+        options = dict(self.options)
+        renditions = options.pop("renditions", None)
+        if video_path is None:
+            safe_print(
+                f"{event}: pas de VOD, thumbnails uniquement (une VOD deposee "
+                "plus tard relancera l'evenement)",
+                log_queue=self.log_queue,
+            )
+            generate_thumbnails_only(
+                csv_path, output_dir=output_dir, log_queue=self.log_queue, **options
+            )
+        else:
+            process_video(
+                video_path,
+                csv_path,
+                output_dir=output_dir,
+                log_queue=self.log_queue,
+                renditions=renditions,
+                **options,
+            )
+
+    def worker(self):
+        while True:
+            event = self.jobs.get()
+            if event is None:
+                return
+            with self.lock:
+                self.pending.discard(event)
+                event_lock = self.event_locks[event]
+            with event_lock:
+                safe_print(f"Traitement de {event}", log_queue=self.log_queue)
+                start = time.perf_counter()
+                try:
+                    self.run_event(event)
+                    safe_print(
+                        f"[OK] {event} traite en {time.perf_counter() - start:.1f}s",
+                        log_queue=self.log_queue,
+                    )
+                except Exception as e:
+                    safe_print(f"[ERREUR] {event}: {e}", log_queue=self.log_queue)
+
+    def run(self):
+        os.makedirs(self.output_root, exist_ok=True)
+        for worker in self.workers:
+            worker.start()
+        try:
+            watcher = Inotify(self.watch_dir)
+        except (OSError, AttributeError, TypeError) as e:
+            safe_print(
+                f"inotify indisponible ({e}), relecture du dossier toutes les "
+                f"{WATCH_POLL_SECONDS}s",
+                log_queue=self.log_queue,
+            )
+            watcher = None
+        safe_print(f"Surveillance de {self.watch_dir}", log_queue=self.log_queue)
+        # Les fichiers deja presents sont traites au demarrage (le manifeste
+        # evite de refaire ce qui est a jour).
+        self.scan()
+        try:
+            while True:
+                delay = self.settle()
+                if watcher is None:
+                    time.sleep(WATCH_POLL_SECONDS)
+                    self.scan()
+                    continue
+                names = watcher.read(delay)
+                if names is None:
+                    self.scan()
+                    continue
+                for name in names:
+                    self.touch(name)
+        finally:
+            if watcher is not None:
+                watcher.close()
+            for _ in self.workers:
+                self.jobs.put(None)
 
 
-def generate_thumbnails_only(
-    csv_path,
-    background_path,
-    output_dir="sets_output",
-    sprites_dir="thumbnail/sprites",
-    reset_thumbnails=False,
-    center_logo="thumbnail/assets/LogoBC/LogoBC16.png",
+def watch_folder(
+    watch_dir,
+    output_root=None,
+    workers=WATCH_WORKERS,
     log_queue=None,
+    **options,
 ):
-    os.makedirs(output_dir, exist_ok=True)
-    thumbnail_dir = os.path.join(output_dir, "thumbnails")
-    os.makedirs(thumbnail_dir, exist_ok=True)
-    df = pd.read_csv(csv_path, encoding="utf-8")
-    safe_print("Mode generation de thumbnails uniquement", log_queue=log_queue)
-    safe_print(f"Dossier de sortie: {thumbnail_dir}", log_queue=log_queue)
-    for index, row in df.iterrows():
-        set_name = row["set_name"]
-        if all(
-            field in row
-            for field in [
-                "player1_skin",
-                "player1_name",
-                "player2_skin",
-                "player2_name",
-            ]
-        ):
-            thumbnail_path = os.path.join(thumbnail_dir, f"{set_name}_thumbnail.png")
+    # Une thumbnail reconstruite remplace la precedente.
+    options.setdefault("reset_thumbnails", True)
+    watcher = WatchFolder(
+        watch_dir,
+        output_root or os.path.join(watch_dir, "sets_output"),
+        options,
+        workers=workers,
+        log_queue=log_queue,
+    )
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        safe_print("Arret de la surveillance", log_queue=log_queue)
+        if _ffmpeg_runner is not None:
+            _ffmpeg_runner.shutdown()
+
+
+# ----- Interface Tkinter --------
+
+# Le widget de log ne garde que les LOG_MAX_LINES dernieres lignes, le log
+# complet est ecrit dans LOG_FILE_NAME du dossier de sortie.
+LOG_MAX_LINES = 2000
+LOG_FILE_NAME = "setsplitter.log"
+LOG_POLL_INTERVAL_MS = 100
+LOG_TICK_BUDGET = 0.02
+
+# Apercu: les modifications sont regroupees (PREVIEW_DEBOUNCE_MS) puis
+# rendues par un thread de fond qui ne garde que la derniere demande; la
+# boucle Tk recupere l'image toutes les PREVIEW_POLL_MS tant qu'un rendu est
+# en cours.
+PREVIEW_DEBOUNCE_MS = 40
+PREVIEW_POLL_MS = 10
+PREVIEW_FIELDS = [
+    ("set_name", "Nom du set :"),
+    ("player1_name", "Joueur 1 :"),
+    ("player1_skin", "Skin 1 :"),
+    ("player2_name", "Joueur 2 :"),
+    ("player2_skin", "Skin 2 :"),
+]
+
+
+class PreviewWindow(tk.Toplevel):
+    def __init__(self, app, rows, settings):
+        super().__init__(app)
+        self.title("Aperçu thumbnail")
+        self.app = app
+        self.rows = rows
+        self.settings = settings
+        self.condition = threading.Condition()
+        self.pending = None
+        self.result = None
+        self.closed = False
+        self.debounce_id = None
+        self.polling = False
+        self.requested = 0
+        self.shown = 0
+        self.photo = None
+        self.create_widgets()
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        threading.Thread(target=self.render_loop, daemon=True).start()
+        if rows:
+            self.row_box.current(0)
+            self.select_row()
+
+    def create_widgets(self):
+        padding_opts = {"padx": 10, "pady": 3}
+        self.row_var = tk.StringVar()
+        self.row_box = ttk.Combobox(
+            self,
+            textvariable=self.row_var,
+            values=[f"{i + 1}. {row['set_name']}" for i, row in enumerate(self.rows)],
+            state="readonly",
+            width=50,
+        )
+        self.row_box.grid(row=0, column=0, columnspan=2, sticky="w", **padding_opts)
+        self.row_box.bind("<<ComboboxSelected>>", lambda event: self.select_row())
+        self.field_vars = {}
+        for i, (field, label) in enumerate(PREVIEW_FIELDS, 1):
+            tk.Label(self, text=label).grid(row=i, column=0, sticky="w", **padding_opts)
+            var = tk.StringVar()
+            tk.Entry(self, textvariable=var, width=40).grid(
+                row=i, column=1, sticky="w", **padding_opts
+            )
+            var.trace_add("write", lambda *args: self.schedule_render())
+            self.field_vars[field] = var
+        self.image_label = tk.Label(self)
+        self.image_label.grid(row=len(PREVIEW_FIELDS) + 1, column=0, columnspan=2)
+        self.status_label = tk.Label(self, anchor="w")
+        self.status_label.grid(
+            row=len(PREVIEW_FIELDS) + 2, column=0, columnspan=2, sticky="w"
+        )
+
+    def select_row(self):
+        row = self.rows[self.row_box.current()]
+        for field, var in self.field_vars.items():
+            value = row.get(field)
+            var.set("" if pd.isna(value) else str(value))
+
+    def schedule_render(self):
+        if self.debounce_id is not None:
+            self.after_cancel(self.debounce_id)
+        self.debounce_id = self.after(PREVIEW_DEBOUNCE_MS, self.request_render)
+
+    def request_render(self):
+        self.debounce_id = None
+        row = {field: var.get() for field, var in self.field_vars.items()}
+        self.requested += 1
+        with self.condition:
+            self.pending = (self.requested, row)
+            self.condition.notify()
+        if not self.polling:
+            self.polling = True
+            self.after(PREVIEW_POLL_MS, self.poll_result)
+
+    def render_loop(self):
+        preview = None
+        while True:
+            with self.condition:
+                while self.pending is None and not self.closed:
+                    self.condition.wait()
+                if self.closed:
+                    return
+                (generation, row), self.pending = self.pending, None
+            start = time.perf_counter()
             try:
-                safe_print(
-                    f"Generation thumbnail pour: {set_name}", log_queue=log_queue
-                )
-                create_thumbnail(
-                    background_path,
-                    row["player1_skin"],
-                    row["player1_name"],
-                    row["player2_skin"],
-                    row["player2_name"],
-                    set_name,
-                    thumbnail_path,
-                    sprites_dir,
-                    reset_thumbnails,
-                    center_logo,
-                    log_queue=log_queue,
-                )
+                if preview is None:
+                    preview = ThumbnailPreview(
+                        log_queue=self.app.log_queue, **self.settings
+                    )
+                image = preview.render(row)
             except Exception as e:
                 safe_print(
-                    f"Erreur lors de la generation de la thumbnail pour {set_name}: {e}",
-                    log_queue=log_queue,
+                    f"Erreur lors de l'apercu: {e}", log_queue=self.app.log_queue
                 )
+                image = None
+            with self.condition:
+                self.result = (generation, image, time.perf_counter() - start)
+
+    def poll_result(self):
+        with self.condition:
+            result, self.result = self.result, None
+        if result is not None:
+            self.shown, image, elapsed = result
+            if image is None:
+                self.status_label.config(text="Rendu impossible (voir le journal)")
+            else:
+                self.photo = ImageTk.PhotoImage(image)
+                self.image_label.config(image=self.photo)
+                self.status_label.config(text=f"Rendu en {elapsed * 1000:.0f} ms")
+        # Une demande plus recente est en attente ou en cours de rendu.
+        if self.shown < self.requested and not self.closed:
+            self.after(PREVIEW_POLL_MS, self.poll_result)
         else:
-            safe_print(
-                f"Donnees manquantes pour le set: {set_name}", log_queue=log_queue
-            )
-    safe_print("[OK] Generation des thumbnails terminee!", log_queue=log_queue)
+            self.polling = False
 
+    def on_close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.destroy()
 
-def process_video(
-    input_video_path,
-    csv_path,
-    background_path,
-    output_dir="sets_output",
-    sprites_dir="thumbnail/sprites",
-    reset_thumbnails=False,
-    center_logo="thumbnail/assets/LogoBC/LogoBC16.png",
-    log_queue=None,
-):
-    os.makedirs(output_dir, exist_ok=True)
-    thumbnail_dir = os.path.join(output_dir, "thumbnails")
-    temp_dir = os.path.join(output_dir, "temp")
-    os.makedirs(thumbnail_dir, exist_ok=True)
-    os.makedirs(temp_dir, exist_ok=True)
-    df = pd.read_csv(csv_path, encoding="utf-8")
-    video_info = get_video_info(input_video_path, log_queue=log_queue)
-    if not video_info:
-        safe_print(
-            "Impossible d'obtenir les informations de la video", log_queue=log_queue
+
+# Editeur CSV: seules CSV_EDITOR_VISIBLE_ROWS lignes de champs existent, le
+# defilement y recharge les lignes du document. Une saison de milliers de
+# sets reste aussi reactive qu'un CSV de dix lignes.
+CSV_EDITOR_VISIBLE_ROWS = 20
+CSV_EDITOR_COLUMN_WIDTH = 10
+CSV_EDITOR_WIDTHS = {
+    "set_name": 24,
+    "player1_name": 16,
+    "player2_name": 16,
+    "video_title": 30,
+}
+CSV_EDITOR_INVALID = "#f4c7c3"
+CSV_EDITOR_CHANGED = "#fff2cc"
+CSV_EDITOR_DEFAULT = "white"
+
+
+class CsvEditorWindow(tk.Toplevel):
+    def __init__(self, app, path, sprites_dir):
+        super().__init__(app)
+        self.title(f"Édition de {os.path.basename(path)}")
+        self.document = CsvDocument(path)
+        self.sprite_index = get_sprite_index(sprites_dir)
+        self.top = 0
+        self.loading = False
+        self.create_widgets()
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.refresh()
+
+    def create_widgets(self):
+        toolbar = tk.Frame(self)
+        toolbar.pack(side=tk.TOP, fill=tk.X, padx=10, pady=5)
+        tk.Button(toolbar, text="Enregistrer", command=self.save).pack(side=tk.LEFT)
+        tk.Button(toolbar, text="Ajouter une ligne", command=self.add_row).pack(
+            side=tk.LEFT, padx=5
         )
-        return
-    safe_print(f"Video chargee: {input_video_path}", log_queue=log_queue)
-    safe_print(f"FPS: {video_info['fps']}", log_queue=log_queue)
-    safe_print(f"Audio: {video_info['has_audio']}", log_queue=log_queue)
-    safe_print(f"Duree: {video_info['duration']:.2f}s", log_queue=log_queue)
-    for index, row in df.iterrows():
-        safe_print(f"\n{'='*50}", log_queue=log_queue)
-        safe_print(f"Traitement du set: {row['set_name']}", log_queue=log_queue)
-        safe_print(f"{'='*50}", log_queue=log_queue)
-        set_name = row["set_name"]
-        clips_data = []
-        if all(
-            field in row
-            for field in [
-                "player1_skin",
-                "player1_name",
-                "player2_skin",
-                "player2_name",
-            ]
-        ):
-            thumbnail_path = os.path.join(thumbnail_dir, f"{set_name}_thumbnail.png")
-            try:
-                create_thumbnail(
-                    background_path,
-                    row["player1_skin"],
-                    row["player1_name"],
-                    row["player2_skin"],
-                    row["player2_name"],
-                    set_name,
-                    thumbnail_path,
-                    sprites_dir,
-                    reset_thumbnails,
-                    center_logo,
-                    log_queue=log_queue,
+        self.status_label = tk.Label(toolbar, anchor="w")
+        self.status_label.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+
+        body = tk.Frame(self)
+        body.pack(side=tk.TOP, fill=tk.BOTH, expand=True, padx=10, pady=5)
+        self.vscroll = tk.Scrollbar(body, orient=tk.VERTICAL, command=self.on_vscroll)
+        self.vscroll.pack(side=tk.RIGHT, fill=tk.Y)
+        hscroll = tk.Scrollbar(body, orient=tk.HORIZONTAL)
+        hscroll.pack(side=tk.BOTTOM, fill=tk.X)
+        canvas = tk.Canvas(body, xscrollcommand=hscroll.set, highlightthickness=0)
+        canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        hscroll.config(command=canvas.xview)
+        table = tk.Frame(canvas)
+        canvas.create_window((0, 0), window=table, anchor="nw")
+
+        columns = self.document.columns
+        tk.Label(table, text="#").grid(row=0, column=0)
+        for column, name in enumerate(columns):
+            tk.Label(table, text=name).grid(row=0, column=column + 1, sticky="w")
+        self.numbers = []
+        self.vars = []
+        self.entries = []
+        for slot in range(CSV_EDITOR_VISIBLE_ROWS):
+            number = tk.Label(table, width=6, anchor="e")
+            number.grid(row=slot + 1, column=0)
+            self.numbers.append(number)
+            slot_vars = []
+            slot_entries = []
+            for column, name in enumerate(columns):
+                var = tk.StringVar()
+                entry = tk.Entry(
+                    table,
+                    textvariable=var,
+                    width=CSV_EDITOR_WIDTHS.get(name, CSV_EDITOR_COLUMN_WIDTH),
                 )
-            except Exception as e:
-                safe_print(
-                    f"Erreur lors de la generation de la thumbnail: {e}",
-                    log_queue=log_queue,
+                entry.grid(row=slot + 1, column=column + 1)
+                var.trace_add(
+                    "write", lambda *args, s=slot, c=column: self.on_edit(s, c)
                 )
-        for i in range(1, 6):
-            start_tc = row.get(f"start{i}")
-            end_tc = row.get(f"end{i}")
-            start_sec = timecode_to_seconds(start_tc)
-            end_sec = timecode_to_seconds(end_tc)
-            if start_sec is not None and end_sec is not None and start_sec < end_sec:
-                safe_print(
-                    f"Clip {i} ajoute: {start_tc} -> {end_tc} ({start_sec}s - {end_sec}s)",
-                    log_queue=log_queue,
+                entry.bind(
+                    "<FocusIn>", lambda e, s=slot, c=column: self.show_error(s, c)
                 )
-                clips_data.append((start_sec, end_sec))
-        if clips_data:
-            temp_files = extract_clips_ffmpeg(
-                input_video_path, clips_data, temp_dir, log_queue=log_queue
-            )
-            if temp_files:
-                output_path = os.path.join(output_dir, f"{set_name}.mp4")
-                safe_print(f"Concatenation vers: {output_path}", log_queue=log_queue)
-                if concatenate_clips_ffmpeg(
-                    temp_files, output_path, log_queue=log_queue
-                ):
-                    safe_print(f"[OK] Export termine: {set_name}", log_queue=log_queue)
-                else:
-                    safe_print(
-                        f"[ERREUR] Erreur lors de l'export: {set_name}",
-                        log_queue=log_queue,
+                entry.bind("<Up>", lambda e, s=slot, c=column: self.move(s, c, -1))
+                entry.bind("<Down>", lambda e, s=slot, c=column: self.move(s, c, 1))
+                slot_vars.append(var)
+                slot_entries.append(entry)
+            self.vars.append(slot_vars)
+            self.entries.append(slot_entries)
+        table.update_idletasks()
+        canvas.config(
+            scrollregion=canvas.bbox("all"),
+            width=min(table.winfo_reqwidth(), 1200),
+            height=table.winfo_reqheight(),
+        )
+        # Les liaisons de la fenetre s'appliquent a tous ses champs.
+        for sequence in ["<MouseWheel>", "<Button-4>", "<Button-5>"]:
+            self.bind(sequence, self.on_mousewheel)
+
+    def refresh(self):
+        self.loading = True
+        try:
+            for slot in range(CSV_EDITOR_VISIBLE_ROWS):
+                index = self.top + slot
+                present = index < len(self.document)
+                self.numbers[slot].config(text=str(index + 1) if present else "")
+                for column, var in enumerate(self.vars[slot]):
+                    var.set(self.document.get(index, column) if present else "")
+                    self.entries[slot][column].config(
+                        state=tk.NORMAL if present else tk.DISABLED
                     )
-                for temp_file in temp_files:
-                    try:
-                        os.remove(temp_file)
-                    except Exception as e:
-                        safe_print(
-                            f"Impossible de supprimer {temp_file}: {e}",
-                            log_queue=log_queue,
-                        )
+                if present:
+                    self.color_row(slot)
+        finally:
+            self.loading = False
+        total = max(len(self.document), 1)
+        self.vscroll.set(
+            self.top / total,
+            min(1.0, (self.top + CSV_EDITOR_VISIBLE_ROWS) / total),
+        )
+        self.update_status()
+
+    def color_row(self, slot):
+        # Une fin se valide par rapport a son debut: toute la ligne est revue.
+        index = self.top + slot
+        row = self.document.rows[index]
+        changed = index in self.document.changed
+        for column, entry in enumerate(self.entries[slot]):
+            error = validate_csv_cell(
+                self.document.columns, row, column, self.sprite_index
+            )
+            if error:
+                color = CSV_EDITOR_INVALID
+            elif changed:
+                color = CSV_EDITOR_CHANGED
             else:
-                safe_print(
-                    f"Aucun clip extrait pour le set: {set_name}", log_queue=log_queue
-                )
+                color = CSV_EDITOR_DEFAULT
+            entry.config(bg=color)
+
+    def on_edit(self, slot, column):
+        if self.loading:
+            return
+        index = self.top + slot
+        if index >= len(self.document):
+            return
+        self.document.set(index, column, self.vars[slot][column].get())
+        self.color_row(slot)
+        self.show_error(slot, column)
+
+    def show_error(self, slot, column):
+        index = self.top + slot
+        if index >= len(self.document):
+            return
+        error = validate_csv_cell(
+            self.document.columns,
+            self.document.rows[index],
+            column,
+            self.sprite_index,
+        )
+        self.update_status(error)
+
+    def update_status(self, error=None):
+        text = f"{len(self.document)} lignes, {len(self.document.changed)} modifiees"
+        self.status_label.config(text=f"{text} - {error}" if error else text)
+
+    def scroll_to(self, top):
+        top = max(0, min(top, len(self.document) - CSV_EDITOR_VISIBLE_ROWS))
+        if top != self.top:
+            self.top = top
+            self.refresh()
+
+    def on_vscroll(self, action, *args):
+        if action == "moveto":
+            self.scroll_to(int(float(args[0]) * len(self.document)))
+        elif action == "scroll":
+            step = int(args[0])
+            if args[1] == "pages":
+                step *= CSV_EDITOR_VISIBLE_ROWS
+            self.scroll_to(self.top + step)
+
+    def on_mousewheel(self, event):
+        if event.num == 4:
+            step = -3
+        elif event.num == 5:
+            step = 3
         else:
-            safe_print(
-                f"Aucun clip valide trouve pour le set: {set_name}", log_queue=log_queue
-            )
-    try:
-        os.rmdir(temp_dir)
-    except:
-        pass
-    safe_print(f"\n[OK] Traitement termine!", log_queue=log_queue)
+            step = -3 if event.delta > 0 else 3
+        self.scroll_to(self.top + step)
 
+    def move(self, slot, column, step):
+        # Fleches haut/bas: le focus change de champ, ou la vue defile au bord.
+        target = slot + step
+        if 0 <= target < CSV_EDITOR_VISIBLE_ROWS:
+            self.entries[target][column].focus_set()
+        else:
+            self.scroll_to(self.top + step)
+        return "break"
 
-# ----- Interface Tkinter --------
+    def add_row(self):
+        index = self.document.append()
+        self.scroll_to(index - CSV_EDITOR_VISIBLE_ROWS + 1)
+        self.refresh()
+        slot = index - self.top
+        self.entries[slot][0].focus_set()
+
+    def save(self):
+        try:
+            saved = self.document.save()
+        except OSError as e:
+            messagebox.showerror(
+                "Erreur", f"Enregistrement impossible: {e}", parent=self
+            )
+            return False
+        self.refresh()
+        self.status_label.config(text=f"{saved} lignes enregistrees")
+        return True
+
+    def on_close(self):
+        if self.document.changed:
+            answer = messagebox.askyesnocancel(
+                "Modifications",
+                "Enregistrer les modifications du CSV ?",
+                parent=self,
+            )
+            if answer is None or (answer and not self.save()):
+                return
+        self.destroy()
 
 
 class App(tk.Tk):
     def __init__(self):
         super().__init__()
         self.title("Interface de génération de thumbnails et vidéo")
-        self.geometry("600x550")
+        self.geometry("600x770")
         self.log_queue = queue.Queue()
+        self.log_file = None
         self.process = None
         self.create_widgets()
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
         self.check_queue()
 
+    def on_close(self):
+        # Les ffmpeg en cours sont tues avec la fenetre.
+        if _ffmpeg_runner is not None:
+            _ffmpeg_runner.shutdown()
+        self.close_log_file()
+        self.destroy()
+
     def create_widgets(self):
         padding_opts = {"padx": 10, "pady": 5}
 
@@ -542,8 +4258,13 @@ class App(tk.Tk):
         )
         self.csv_entry = tk.Entry(self, width=50)
         self.csv_entry.grid(row=0, column=1, **padding_opts)
-        tk.Button(self, text="Parcourir...", command=self.browse_csv).grid(
-            row=0, column=2, **padding_opts
+        csv_buttons = tk.Frame(self)
+        csv_buttons.grid(row=0, column=2, **padding_opts)
+        tk.Button(csv_buttons, text="Parcourir...", command=self.browse_csv).pack(
+            side=tk.LEFT
+        )
+        tk.Button(csv_buttons, text="Éditer...", command=self.open_csv_editor).pack(
+            side=tk.LEFT, padx=(5, 0)
         )
 
         tk.Label(self, text="Fichier vidéo :").grid(
@@ -584,29 +4305,105 @@ class App(tk.Tk):
         )
         self.logo_entry.insert(0, "thumbnail/assets/LogoBC/LogoBC16.png")
 
-        tk.Label(self, text="Dossier sortie :").grid(
+        tk.Label(self, text="Gabarit thumbnail :").grid(
             row=5, column=0, sticky="w", **padding_opts
         )
+        self.layout_entry = tk.Entry(self, width=50)
+        self.layout_entry.grid(row=5, column=1, **padding_opts)
+        tk.Button(self, text="Parcourir...", command=self.browse_layout).grid(
+            row=5, column=2, **padding_opts
+        )
+        self.layout_entry.insert(0, THUMBNAIL_LAYOUT)
+
+        tk.Label(self, text="Dossier sortie :").grid(
+            row=6, column=0, sticky="w", **padding_opts
+        )
         self.output_entry = tk.Entry(self, width=50)
-        self.output_entry.grid(row=5, column=1, **padding_opts)
+        self.output_entry.grid(row=6, column=1, **padding_opts)
         tk.Button(self, text="Parcourir...", command=self.browse_output).grid(
-            row=5, column=2, **padding_opts
+            row=6, column=2, **padding_opts
         )
         self.output_entry.insert(0, "sets_output")
 
+        tk.Label(self, text="Dossier temporaire :").grid(
+            row=7, column=0, sticky="w", **padding_opts
+        )
+        self.scratch_entry = tk.Entry(self, width=50)
+        self.scratch_entry.grid(row=7, column=1, **padding_opts)
+        tk.Button(self, text="Parcourir...", command=self.browse_scratch).grid(
+            row=7, column=2, **padding_opts
+        )
+
+        tk.Label(self, text="Format thumbnail :").grid(
+            row=8, column=0, sticky="w", **padding_opts
+        )
+        profile_frame = tk.Frame(self)
+        profile_frame.grid(row=8, column=1, sticky="w", **padding_opts)
+        self.thumbnail_profile_var = tk.StringVar(value="png")
+        ttk.Combobox(
+            profile_frame,
+            textvariable=self.thumbnail_profile_var,
+            values=list(THUMBNAIL_PROFILES),
+            state="readonly",
+            width=12,
+        ).pack(side=tk.LEFT)
+        tk.Label(profile_frame, text="Taille max (Ko) :").pack(side=tk.LEFT, padx=5)
+        self.thumbnail_max_kb_entry = tk.Entry(profile_frame, width=8)
+        self.thumbnail_max_kb_entry.pack(side=tk.LEFT)
+        tk.Button(self, text="Aperçu...", command=self.open_preview).grid(
+            row=8, column=2, **padding_opts
+        )
+
+        tk.Label(self, text="Rendus vidéo :").grid(
+            row=9, column=0, sticky="w", **padding_opts
+        )
+        renditions_frame = tk.Frame(self)
+        renditions_frame.grid(row=9, column=1, sticky="w", **padding_opts)
+        self.rendition_vars = {}
+        for name in RENDITION_PROFILES:
+            self.rendition_vars[name] = tk.BooleanVar(value=name in DEFAULT_RENDITIONS)
+            tk.Checkbutton(
+                renditions_frame, text=name, variable=self.rendition_vars[name]
+            ).pack(side=tk.LEFT)
+
+        tk.Label(self, text="Fond depuis la VOD :").grid(
+            row=10, column=0, sticky="w", **padding_opts
+        )
+        gameplay_frame = tk.Frame(self)
+        gameplay_frame.grid(row=10, column=1, sticky="w", **padding_opts)
+        self.gameplay_offset_entry = tk.Entry(gameplay_frame, width=8)
+        self.gameplay_offset_entry.pack(side=tk.LEFT)
+        tk.Label(
+            gameplay_frame, text="s dans le premier clip (vide : image de fond)"
+        ).pack(side=tk.LEFT, padx=5)
+
         self.thumbnails_only_var = tk.BooleanVar()
         tk.Checkbutton(
             self,
             text="Générer uniquement les thumbnails",
             variable=self.thumbnails_only_var,
-        ).grid(row=6, column=1, sticky="w", **padding_opts)
+        ).grid(row=11, column=1, sticky="w", **padding_opts)
 
         self.reset_thumbnails_var = tk.BooleanVar()
         tk.Checkbutton(
             self,
             text="Réinitialiser les thumbnails existants",
             variable=self.reset_thumbnails_var,
-        ).grid(row=7, column=1, sticky="w", **padding_opts)
+        ).grid(row=12, column=1, sticky="w", **padding_opts)
+
+        self.stream_clips_var = tk.BooleanVar()
+        tk.Checkbutton(
+            self,
+            text="Exporter les clips en un seul ffmpeg (sans fichiers temporaires)",
+            variable=self.stream_clips_var,
+        ).grid(row=13, column=1, sticky="w", **padding_opts)
+
+        self.chapters_only_var = tk.BooleanVar()
+        tk.Checkbutton(
+            self,
+            text="Chapitres uniquement (VOD complète remuxée, sans réencodage)",
+            variable=self.chapters_only_var,
+        ).grid(row=14, column=1, sticky="w", **padding_opts)
 
         self.run_button = tk.Button(
             self,
@@ -615,13 +4412,21 @@ class App(tk.Tk):
             bg="green",
             fg="white",
         )
-        self.run_button.grid(row=8, column=1, pady=10)
+        self.run_button.grid(row=15, column=1, pady=10)
+        self.analyse_button = tk.Button(
+            self, text="Analyser la VOD", command=self.run_analysis
+        )
+        self.analyse_button.grid(row=15, column=2, **padding_opts)
+        self.verify_button = tk.Button(
+            self, text="Vérifier les coupes", command=self.run_verification
+        )
+        self.verify_button.grid(row=15, column=0, **padding_opts)
 
         self.progress = ttk.Progressbar(self, length=400, mode="indeterminate")
-        self.progress.grid(row=9, column=0, columnspan=3, padx=10, pady=5)
+        self.progress.grid(row=16, column=0, columnspan=3, padx=10, pady=5)
 
         frame = tk.Frame(self)
-        frame.grid(row=10, column=0, columnspan=3, padx=10, pady=10, sticky="nsew")
+        frame.grid(row=17, column=0, columnspan=3, padx=10, pady=10, sticky="nsew")
         scrollbar = tk.Scrollbar(frame)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         self.output_text = tk.Text(
@@ -629,7 +4434,7 @@ class App(tk.Tk):
         )
         self.output_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.config(command=self.output_text.yview)
-        self.grid_rowconfigure(10, weight=1)
+        self.grid_rowconfigure(17, weight=1)
         self.grid_columnconfigure(1, weight=1)
 
     def browse_csv(self):
@@ -666,12 +4471,24 @@ class App(tk.Tk):
             self.logo_entry.delete(0, tk.END)
             self.logo_entry.insert(0, file)
 
+    def browse_layout(self):
+        file = filedialog.askopenfilename(filetypes=[("Gabarits", "*.json")])
+        if file:
+            self.layout_entry.delete(0, tk.END)
+            self.layout_entry.insert(0, file)
+
     def browse_output(self):
         folder = filedialog.askdirectory()
         if folder:
             self.output_entry.delete(0, tk.END)
             self.output_entry.insert(0, folder)
 
+    def browse_scratch(self):
+        folder = filedialog.askdirectory()
+        if folder:
+            self.scratch_entry.delete(0, tk.END)
+            self.scratch_entry.insert(0, folder)
+
     def validate_inputs(self):
         csv_path = self.csv_entry.get()
         video_path = self.video_entry.get()
@@ -679,11 +4496,26 @@ class App(tk.Tk):
         sprites_dir = self.sprites_entry.get()
         logo_path = self.logo_entry.get()
         thumbnails_only = self.thumbnails_only_var.get()
+        chapters_only = self.chapters_only_var.get()
         if not os.path.exists(csv_path):
             messagebox.showerror(
                 "Erreur", "Le fichier CSV est invalide ou n'existe pas."
             )
             return False
+        if thumbnails_only and chapters_only:
+            messagebox.showerror(
+                "Erreur",
+                "Choisissez soit les thumbnails uniquement, soit les chapitres.",
+            )
+            return False
+        if chapters_only:
+            # Ni thumbnail ni encodage: seule la video source est requise.
+            if not os.path.exists(video_path):
+                messagebox.showerror(
+                    "Erreur", "Le fichier vidéo est invalide ou n'existe pas."
+                )
+                return False
+            return True
         if not os.path.exists(background_path):
             messagebox.showerror(
                 "Erreur", "L'image de fond est invalide ou n'existe pas."
@@ -699,6 +4531,25 @@ class App(tk.Tk):
                 "Erreur", "Le fichier logo central est invalide ou n'existe pas."
             )
             return False
+        if not os.path.exists(self.layout_entry.get()):
+            messagebox.showerror(
+                "Erreur", "Le gabarit de thumbnail est invalide ou n'existe pas."
+            )
+            return False
+        if self.gameplay_offset() is False:
+            messagebox.showerror(
+                "Erreur", "Le décalage du fond doit être un nombre de secondes."
+            )
+            return False
+        max_kb = self.thumbnail_max_kb_entry.get().strip()
+        if max_kb and not (max_kb.isdigit() and int(max_kb) > 0):
+            messagebox.showerror(
+                "Erreur", "La taille max des thumbnails doit etre un nombre de Ko."
+            )
+            return False
+        if not thumbnails_only and not self.selected_renditions():
+            messagebox.showerror("Erreur", "Choisissez au moins un rendu vidéo.")
+            return False
         if not thumbnails_only and (not os.path.exists(video_path) or video_path == ""):
             messagebox.showerror(
                 "Erreur",
@@ -707,15 +4558,121 @@ class App(tk.Tk):
             return False
         return True
 
+    def open_csv_editor(self):
+        csv_path = self.csv_entry.get()
+        if not os.path.exists(csv_path):
+            messagebox.showerror(
+                "Erreur", "Le fichier CSV est invalide ou n'existe pas."
+            )
+            return
+        try:
+            CsvEditorWindow(self, csv_path, self.sprites_entry.get())
+        except (OSError, ValueError, csv.Error) as e:
+            messagebox.showerror("Erreur", f"Lecture du CSV impossible: {e}")
+
+    def open_preview(self):
+        csv_path = self.csv_entry.get()
+        if not os.path.exists(csv_path):
+            messagebox.showerror(
+                "Erreur", "Le fichier CSV est invalide ou n'existe pas."
+            )
+            return
+        if not os.path.exists(self.background_entry.get()):
+            messagebox.showerror(
+                "Erreur", "L'image de fond est invalide ou n'existe pas."
+            )
+            return
+        try:
+            rows = pd.read_csv(csv_path, encoding="utf-8").to_dict("records")
+        except Exception as e:
+            messagebox.showerror("Erreur", f"Lecture du CSV impossible: {e}")
+            return
+        PreviewWindow(
+            self,
+            rows,
+            {
+                "background_path": self.background_entry.get(),
+                "center_logo": self.logo_entry.get(),
+                "sprites_dir": self.sprites_entry.get(),
+                "layout_path": self.layout_entry.get(),
+            },
+        )
+
+    def gameplay_offset(self):
+        # None: fond fixe; False: saisie invalide.
+        value = self.gameplay_offset_entry.get().strip().replace(",", ".")
+        if not value:
+            return None
+        try:
+            offset = float(value)
+        except ValueError:
+            return False
+        return offset if offset >= 0 else False
+
+    def selected_renditions(self):
+        return [name for name, var in self.rendition_vars.items() if var.get()]
+
     def run_process(self):
         if not self.validate_inputs():
             return
+        self.start_task(self.process_thread)
+
+    def run_analysis(self):
+        if not os.path.exists(self.video_entry.get()):
+            messagebox.showerror(
+                "Erreur", "Le fichier vidéo est invalide ou n'existe pas."
+            )
+            return
+        self.start_task(self.analysis_thread)
+
+    def run_verification(self):
+        if not os.path.exists(self.csv_entry.get()):
+            messagebox.showerror(
+                "Erreur", "Le fichier CSV est invalide ou n'existe pas."
+            )
+            return
+        if not os.path.exists(self.video_entry.get()):
+            messagebox.showerror(
+                "Erreur", "Le fichier vidéo est invalide ou n'existe pas."
+            )
+            return
+        self.start_task(self.verification_thread)
+
+    def start_task(self, target):
         self.run_button.config(state="disabled")
+        self.analyse_button.config(state="disabled")
+        self.verify_button.config(state="disabled")
         self.output_text.delete(1.0, tk.END)
+        self.open_log_file(self.output_entry.get())
         self.progress.start(10)
-        thread = threading.Thread(target=self.process_thread, daemon=True)
+        thread = threading.Thread(target=target, daemon=True)
         thread.start()
 
+    def analysis_thread(self):
+        try:
+            analyse_vod(
+                self.video_entry.get(),
+                self.output_entry.get(),
+                log_queue=self.log_queue,
+            )
+        except Exception as e:
+            self.log_queue.put(f"\nErreur lors de l'analyse: {str(e)}\n")
+        finally:
+            self.log_queue.put("__DONE__")
+
+    def verification_thread(self):
+        try:
+            generate_verification_sheets(
+                self.video_entry.get(),
+                self.csv_entry.get(),
+                self.output_entry.get(),
+                log_queue=self.log_queue,
+            )
+        except Exception as e:
+            self.log_queue.put(f"\nErreur lors de la verification: {str(e)}\n")
+        finally:
+            self.log_queue.put("__DONE__")
+
     def process_thread(self):
         csv_path = self.csv_entry.get()
         video_path = self.video_entry.get()
@@ -725,6 +4682,14 @@ class App(tk.Tk):
         output_dir = self.output_entry.get()
         thumbnails_only = self.thumbnails_only_var.get()
         reset_thumbnails = self.reset_thumbnails_var.get()
+        stream_clips = self.stream_clips_var.get()
+        chapters_only = self.chapters_only_var.get()
+        scratch_dir = self.scratch_entry.get() or None
+        thumbnail_profile = self.thumbnail_profile_var.get()
+        layout_path = self.layout_entry.get()
+        max_kb = self.thumbnail_max_kb_entry.get().strip()
+        thumbnail_max_bytes = int(max_kb) * 1024 if max_kb else None
+        gameplay_offset = self.gameplay_offset()
         self.log_queue.put("Lancement du traitement...\n")
         try:
             if thumbnails_only:
@@ -736,6 +4701,15 @@ class App(tk.Tk):
                     reset_thumbnails,
                     logo_path,
                     log_queue=self.log_queue,
+                    thumbnail_profile=thumbnail_profile,
+                    thumbnail_max_bytes=thumbnail_max_bytes,
+                    layout_path=layout_path,
+                    source_video=video_path if os.path.exists(video_path) else None,
+                    gameplay_offset=gameplay_offset,
+                )
+            elif chapters_only:
+                generate_chapters_only(
+                    video_path, csv_path, output_dir, log_queue=self.log_queue
                 )
             else:
                 process_video(
@@ -747,6 +4721,13 @@ class App(tk.Tk):
                     reset_thumbnails,
                     logo_path,
                     log_queue=self.log_queue,
+                    stream_clips=stream_clips,
+                    scratch_dir=scratch_dir,
+                    thumbnail_profile=thumbnail_profile,
+                    thumbnail_max_bytes=thumbnail_max_bytes,
+                    layout_path=layout_path,
+                    renditions=self.selected_renditions(),
+                    gameplay_offset=gameplay_offset,
                 )
             self.log_queue.put("\nTraitement terminé avec succès.\n")
         except Exception as e:
@@ -754,21 +4735,99 @@ class App(tk.Tk):
         finally:
             self.log_queue.put("__DONE__")
 
+    def open_log_file(self, output_dir):
+        self.close_log_file()
+        try:
+            os.makedirs(output_dir, exist_ok=True)
+            self.log_file = open(
+                os.path.join(output_dir, LOG_FILE_NAME), "w", encoding="utf-8"
+            )
+        except OSError as e:
+            self.output_text.insert(
+                tk.END, f"Impossible d'ouvrir le fichier de log: {e}\n"
+            )
+
+    def close_log_file(self):
+        if self.log_file is not None:
+            self.log_file.close()
+            self.log_file = None
+
+    def append_log(self, messages):
+        if self.log_file is not None:
+            self.log_file.write("".join(messages))
+            self.log_file.flush()
+        self.output_text.insert(tk.END, "".join(messages[-LOG_MAX_LINES:]))
+        line_count = int(self.output_text.index("end-1c").split(".")[0])
+        if line_count > LOG_MAX_LINES:
+            self.output_text.delete("1.0", f"{line_count - LOG_MAX_LINES + 1}.0")
+        self.output_text.see(tk.END)
+
     def check_queue(self):
+        # Vide la file par lots, dans la limite de LOG_TICK_BUDGET secondes par
+        # tick pour ne pas bloquer la boucle Tk.
+        messages = []
+        done = False
+        deadline = time.perf_counter() + LOG_TICK_BUDGET
         try:
-            while True:
+            while time.perf_counter() < deadline:
                 msg = self.log_queue.get_nowait()
                 if msg == "__DONE__":
-                    self.progress.stop()
-                    self.run_button.config(state="normal")
-                else:
-                    self.output_text.insert(tk.END, msg)
-                    self.output_text.see(tk.END)
+                    done = True
+                    break
+                messages.append(msg)
         except queue.Empty:
             pass
-        self.after(100, self.check_queue)
+        if messages:
+            self.append_log(messages)
+        if done:
+            self.progress.stop()
+            self.run_button.config(state="normal")
+            self.analyse_button.config(state="normal")
+            self.verify_button.config(state="normal")
+            self.close_log_file()
+        # Relance immediate s'il reste des messages en attente.
+        delay = 1 if not self.log_queue.empty() else LOG_POLL_INTERVAL_MS
+        self.after(delay, self.check_queue)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Decoupe des sets et generation des thumbnails"
+    )
+    parser.add_argument(
+        "--watch", metavar="DOSSIER", help="surveille un dossier de depot (sans GUI)"
+    )
+    parser.add_argument("--output", help="dossier de sortie du mode --watch")
+    parser.add_argument(
+        "--background", default="thumbnail/background/Background_BC.png"
+    )
+    parser.add_argument("--sprites_dir", default="thumbnail/sprites")
+    parser.add_argument("--center_logo", default="thumbnail/assets/LogoBC/LogoBC16.png")
+    parser.add_argument("--layout", default=THUMBNAIL_LAYOUT)
+    parser.add_argument(
+        "--thumbnail_profile", choices=list(THUMBNAIL_PROFILES), default="png"
+    )
+    parser.add_argument(
+        "--renditions", nargs="+", choices=list(RENDITION_PROFILES), default=None
+    )
+    parser.add_argument("--workers", type=int, default=WATCH_WORKERS)
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
-    app = App()
-    app.mainloop()
+    args = parse_args()
+    if args.watch:
+        watch_folder(
+            args.watch,
+            args.output,
+            workers=args.workers,
+            background_path=args.background,
+            sprites_dir=args.sprites_dir,
+            center_logo=args.center_logo,
+            layout_path=args.layout,
+            thumbnail_profile=args.thumbnail_profile,
+            renditions=args.renditions,
+        )
+    else:
+        app = App()
+        app.mainloop()